@@ -1,40 +1,55 @@
 import base64
-from io import BytesIO
+import html
+import math
 from pathlib import Path
 
 import streamlit as st
-from openpyxl.utils import get_column_letter
-import openpyxl
 
 try:
     from planilha_engine import (
-        extract_lines_from_pdf_file,
+        iter_lines_from_pdf,
+        read_pdf_bytes,
+        pdf_cache_key,
+        probe_pdf,
+        load_cached_lines,
+        store_cached_lines,
         extract_plan_signature,
         resolve_art_by_plan_rule,
         resolve_action_header_title_by_plan,
-        extract_analysis_data,
-        collect_analysis_missing_cells,
         is_analysis_template_file,
         get_analysis_items_header_info,
-        find_items_table_header_row,
-        parse_items,
+        parse_document,
         build_rows,
-        generate_excel_bytes,
+        render_excel,
+        new_result_id,
+        result_workbook_path,
+        store_result,
+        load_result,
+        result_cache_key,
+        warm_template,
         get_template_header_info,
     )
 except ImportError:
     from planilha_engine import (
-        extract_lines_from_pdf_file,
+        iter_lines_from_pdf,
+        read_pdf_bytes,
+        pdf_cache_key,
+        probe_pdf,
+        load_cached_lines,
+        store_cached_lines,
         extract_plan_signature,
         resolve_art_by_plan_rule,
-        extract_analysis_data,
-        collect_analysis_missing_cells,
         is_analysis_template_file,
         get_analysis_items_header_info,
-        find_items_table_header_row,
-        parse_items,
+        parse_document,
         build_rows,
-        generate_excel_bytes,
+        render_excel,
+        new_result_id,
+        result_workbook_path,
+        store_result,
+        load_result,
+        result_cache_key,
+        warm_template,
         get_template_header_info,
     )
 
@@ -46,6 +61,7 @@ LOCAL_TEMPLATE_PATH = BASE_DIR / "Planilha Base(atualizada).xlsx"
 LOGO_PATH = BASE_DIR / "Logo.png"
 FAVICON_PATH = BASE_DIR / "favicon_mj.png"
 REQUIRED_TEMPLATE_NAME = "Planilha Base(atualizada).xlsx"
+BLANK_RANGES_PAGE_SIZE = 50
 
 
 def resolve_template_path():
@@ -176,13 +192,28 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-logo_b64 = ""
-if LOGO_PATH.exists():
+@st.cache_resource(show_spinner=False)
+def _static_asset_base64(path_str: str) -> str:
+    # Lido e codificado uma vez por processo, não a cada rerun do script.
+    path = Path(path_str)
+    if not path.exists():
+        return ""
     try:
-        logo_bytes = LOGO_PATH.read_bytes()
-        logo_b64 = base64.b64encode(logo_bytes).decode("ascii")
+        return base64.b64encode(path.read_bytes()).decode("ascii")
     except Exception:
-        logo_b64 = ""
+        return ""
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_template(path_str: str, mtime_ns: int, size: int) -> bool:
+    # Descritor e snapshot do template ficam no processo, uma vez por versão
+    # do arquivo (mtime/tamanho na chave); devolve se é template de análise.
+    path = Path(path_str)
+    warm_template(path)
+    return is_analysis_template_file(path)
+
+
+logo_b64 = _static_asset_base64(str(LOGO_PATH))
 
 logo_html = ""
 if logo_b64:
@@ -217,9 +248,25 @@ st.markdown(
 )
 
 uploaded_file = st.file_uploader("PDF do Plano", type=["pdf"])
+numeric_values = st.checkbox(
+    "Gravar Valor Planejado Total como número (formato R$)",
+    help="Células numéricas somam e filtram direto no Excel, sem converter texto.",
+)
+
+# Cada sessão guarda só o id do resultado. A planilha e o resumo ficam em
+# disco (store_result), compartilhados entre sessões pelo conteúdo
+# (result_cache_key) e limpos por TTL e limite global de tamanho.
+if "result_id" not in st.session_state:
+    st.session_state.result_id = None
+# Resultado cuja planilha foi pedida para download (botão "Preparar download").
+if "download_result_id" not in st.session_state:
+    st.session_state.download_result_id = None
+
+
+def _release_download():
+    # Depois do download o botão sai da página e o Streamlit descarta os bytes.
+    st.session_state.download_result_id = None
 
-if "result" not in st.session_state:
-    st.session_state.result = None
 
 if st.button("Processar", type="primary", disabled=uploaded_file is None):
     template_source, template_error = resolve_template_path()
@@ -230,134 +277,170 @@ if st.button("Processar", type="primary", disabled=uploaded_file is None):
     else:
         try:
             with st.status("Processando PDF...", expanded=True) as status:
-                status.write("Lendo PDF")
-                lines = extract_lines_from_pdf_file(uploaded_file)
-                if not lines:
-                    status.update(label="PDF sem texto selecionável.", state="error")
-                    st.error(
-                        "Não foi possível extrair texto do PDF enviado. "
-                        "Esse arquivo parece ser escaneado (imagem). "
-                        "Envie um PDF com texto selecionável."
+                template_stat = template_source.stat()
+                analysis_mode = _warm_template(
+                    str(template_source), template_stat.st_mtime_ns, template_stat.st_size
+                )
+                pdf_bytes = read_pdf_bytes(uploaded_file)
+                cache_key = pdf_cache_key(pdf_bytes)
+                result_id = result_cache_key(
+                    cache_key, template_source, numeric_values=numeric_values
+                )
+                cached_result = load_result(result_id)
+                if cached_result is not None:
+                    status.write("Mesmo PDF e template: usando planilha já gerada")
+                    st.session_state.pop("blank_cells_page", None)
+                    st.session_state.result_id = result_id
+                    st.session_state.show_title_update_modal = (
+                        cached_result.get("plan_year") in {2023, 2024}
                     )
-                    st.session_state.result = None
-                    st.stop()
-                analysis_mode = is_analysis_template_file(template_source)
-
-                status.write("Extraindo itens")
-                parsed_items = parse_items(lines)
-                if not analysis_mode and not parsed_items:
-                    status.update(label="Nenhum item encontrado.", state="error")
-                    st.error("Nenhum item encontrado no PDF.")
-                    st.session_state.result = None
+                    status.update(label="Processamento concluído.", state="complete")
                 else:
-                    status.write("Montando planilha")
-                    signature = extract_plan_signature(lines)
-                    art_num_preferred = resolve_art_by_plan_rule(
-                        signature["sigla"], signature["ano"]
-                    )
-                    action_header_title_preferred = resolve_action_header_title_by_plan(
-                        signature["sigla"], signature["ano"]
-                    )
-                    if analysis_mode:
-                        analysis_data = extract_analysis_data(lines)
-                        sections = analysis_data.get("sections", [])
-                        header_row, _, items_header_map = get_analysis_items_header_info(
-                            template_source
-                        )
-                        rows = build_rows(parsed_items, items_header_map)
-                        excel_bytes = generate_excel_bytes(
-                            template_source,
-                            rows=rows,
-                            header_map={},
-                            art_num_preferred=art_num_preferred,
-                            action_header_title_preferred=action_header_title_preferred,
-                            source_lines=lines,
-                        )
-                        missing_cells = set(collect_analysis_missing_cells(analysis_data))
-                        missing_rows = set()
-                        generated_wb = openpyxl.load_workbook(BytesIO(excel_bytes))
-                        generated_ws = generated_wb.active
-                        generated_header_row = find_items_table_header_row(generated_ws)
-                        start_row = (
-                            generated_header_row + 1
-                            if generated_header_row
-                            else (header_row + 1 if header_row else 3)
-                        )
-                        for index, row_data in enumerate(rows):
-                            excel_row = start_row + index
-                            for header, col_index in items_header_map.items():
-                                value = row_data.get(header)
-                                if value is None or value == "":
-                                    cell = f"{get_column_letter(col_index)}{excel_row}"
-                                    missing_cells.add(cell)
-                                    missing_rows.add(excel_row)
-                        st.session_state.result = {
-                            "mode": "analysis",
-                            "rows": rows,
-                            "excel_bytes": excel_bytes,
-                            "meta_counts": {s["numero_meta"]: 1 for s in sections},
-                            "missing_cells": sorted(missing_cells),
-                            "missing_items_count": len(missing_cells),
-                            "sections_count": len(sections),
-                            "items_count": len(parsed_items),
-                        }
+                    lines = load_cached_lines(cache_key)
+                    if lines is not None:
+                        status.write("PDF já processado: usando texto em cache")
+                        document = parse_document(lines, with_analysis=analysis_mode)
                     else:
-                        _, header_map = get_template_header_info(template_source)
-                        rows = build_rows(parsed_items, header_map)
-                        excel_bytes = generate_excel_bytes(
-                            template_source,
-                            rows,
-                            header_map,
-                            art_num_preferred=art_num_preferred,
-                            action_header_title_preferred=action_header_title_preferred,
-                            source_lines=lines,
+                        # Sonda só as primeiras páginas: PDF escaneado (sem camada
+                        # de texto) é recusado sem extrair o documento inteiro.
+                        probe = probe_pdf(pdf_bytes)
+                        document = {"lines": [], "items": [], "analysis": None}
+                        if probe["has_text"]:
+                            status.write(
+                                f"Lendo PDF ({probe['page_count']} páginas) e extraindo itens"
+                            )
+                            extraction_stats = {}
+                            line_stream = iter_lines_from_pdf(
+                                pdf_bytes, low_memory=True, stats=extraction_stats
+                            )
+                            # Itens e dados de análise saem de uma única passada,
+                            # enquanto as páginas seguintes ainda são extraídas.
+                            document = parse_document(
+                                line_stream, with_analysis=analysis_mode
+                            )
+                            if extraction_stats.get("peak_rss_bytes"):
+                                status.write(
+                                    f"Páginas lidas: {extraction_stats['pages']} "
+                                    f"(pico de memória: "
+                                    f"{extraction_stats['peak_rss_bytes'] / (1024 * 1024):.0f} MB)"
+                                )
+                            if document["lines"]:
+                                store_cached_lines(cache_key, document["lines"])
+                    lines = document["lines"]
+                    parsed_items = document["items"]
+                    if not lines:
+                        status.update(label="PDF sem texto selecionável.", state="error")
+                        st.error(
+                            "Não foi possível extrair texto do PDF enviado. "
+                            "Esse arquivo parece ser escaneado (imagem). "
+                            "Envie um PDF com texto selecionável."
                         )
+                        st.session_state.result_id = None
+                        st.stop()
 
-                        meta_counts = {}
-                        missing_cells = set()
-                        missing_rows = set()
-                        start_row = 3
-                        for index, row_data in enumerate(rows):
-                            meta = row_data.get("Número da Meta Específica")
-                            item_num = row_data.get("Número do Item")
-                            meta_counts[meta] = meta_counts.get(meta, 0) + 1
-                            excel_row = start_row + index
-                            for header, col_index in header_map.items():
-                                value = row_data.get(header)
-                                if value is None or value == "":
-                                    cell = f"{get_column_letter(col_index)}{excel_row}"
-                                    missing_cells.add(cell)
-                                    missing_rows.add(excel_row)
-
-                        st.session_state.result = {
-                            "mode": "items",
-                            "rows": rows,
-                            "excel_bytes": excel_bytes,
-                            "meta_counts": meta_counts,
-                            "missing_cells": sorted(missing_cells),
-                            "missing_items_count": len(missing_rows),
-                        }
-                    st.session_state.show_title_update_modal = (
-                        signature.get("ano") in {2023, 2024}
-                    )
-                    status.update(label="Processamento concluído.", state="complete")
+                    if not analysis_mode and not parsed_items:
+                        status.update(label="Nenhum item encontrado.", state="error")
+                        st.error("Nenhum item encontrado no PDF.")
+                        st.session_state.result_id = None
+                    else:
+                        status.write("Montando planilha")
+                        st.session_state.pop("blank_cells_page", None)
+                        # Gravada num id provisório: outra sessão pode estar
+                        # gerando o mesmo resultado ao mesmo tempo.
+                        staging_path = result_workbook_path(new_result_id())
+                        try:
+                            signature = extract_plan_signature(lines)
+                            art_num_preferred = resolve_art_by_plan_rule(
+                                signature["sigla"], signature["ano"]
+                            )
+                            action_header_title_preferred = resolve_action_header_title_by_plan(
+                                signature["sigla"], signature["ano"]
+                            )
+                            if analysis_mode:
+                                analysis_data = document["analysis"]
+                                sections = analysis_data.get("sections", [])
+                                _, _, items_header_map = get_analysis_items_header_info(
+                                    template_source
+                                )
+                                rows = build_rows(
+                                    parsed_items, items_header_map, numeric_values=numeric_values
+                                )
+                                report = render_excel(
+                                    template_source,
+                                    staging_path,
+                                    rows=rows,
+                                    header_map={},
+                                    art_num_preferred=art_num_preferred,
+                                    action_header_title_preferred=action_header_title_preferred,
+                                    source_lines=lines,
+                                    analysis_data=analysis_data,
+                                )
+                                summary = {
+                                    "mode": "analysis",
+                                    "total_items": len(rows),
+                                    "total_metas": len({s["numero_meta"] for s in sections}),
+                                    "blank_ranges": report.blank_ranges,
+                                    "blank_cell_count": report.blank_cell_count,
+                                    "missing_items_count": report.blank_cell_count,
+                                    "sections_count": len(sections),
+                                    "items_count": len(parsed_items),
+                                }
+                            else:
+                                _, header_map = get_template_header_info(template_source)
+                                rows = build_rows(
+                                    parsed_items, header_map, numeric_values=numeric_values
+                                )
+                                report = render_excel(
+                                    template_source,
+                                    staging_path,
+                                    rows,
+                                    header_map,
+                                    art_num_preferred=art_num_preferred,
+                                    action_header_title_preferred=action_header_title_preferred,
+                                    source_lines=lines,
+                                )
+
+                                summary = {
+                                    "mode": "items",
+                                    "total_items": len(rows),
+                                    "total_metas": len(
+                                        {row["Número da Meta Específica"] for row in rows}
+                                    ),
+                                    "blank_ranges": report.blank_ranges,
+                                    "blank_cell_count": report.blank_cell_count,
+                                    "missing_items_count": report.missing_row_count,
+                                }
+                            summary["plan_year"] = signature.get("ano")
+                            store_result(result_id, summary, workbook_path=staging_path)
+                            st.session_state.result_id = result_id
+                            st.session_state.show_title_update_modal = (
+                                summary["plan_year"] in {2023, 2024}
+                            )
+                            status.update(label="Processamento concluído.", state="complete")
+                        finally:
+                            # Depois de store_result a planilha já foi movida;
+                            # só sobra o arquivo provisório quando algo falhou.
+                            staging_path.unlink(missing_ok=True)
         except Exception as exc:
             st.exception(exc)
 
-result = st.session_state.result
+result = load_result(st.session_state.result_id)
+if st.session_state.result_id and result is None:
+    st.session_state.result_id = None
+    st.info("O resultado anterior expirou. Processe o PDF novamente.")
 if result:
     mode = result.get("mode", "items")
-    total_items = len(result["rows"])
-    total_metas = len(result["meta_counts"])
+    total_items = result["total_items"]
+    total_metas = result["total_metas"]
     missing_count = result["missing_items_count"]
-    missing_cells = result["missing_cells"]
+    blank_ranges = result["blank_ranges"]
 
     st.subheader("Resumo")
     summary_cols = st.columns(3)
     if mode == "analysis":
         summary_cols[0].metric("Metas encontradas", total_metas)
         summary_cols[1].metric("Itens extraídos", result.get("items_count", 0))
-        summary_cols[2].metric("Células em branco", len(missing_cells))
+        summary_cols[2].metric("Células em branco", result["blank_cell_count"])
     else:
         summary_cols[0].metric("Itens extraídos", total_items)
         summary_cols[1].metric("Metas encontradas", total_metas)
@@ -371,29 +454,70 @@ if result:
         st.session_state.show_title_update_modal = False
         _show_title_update_modal()
 
-    st.download_button(
-        "Baixar Planilha",
-        data=result["excel_bytes"],
-        file_name="Planilha de Itens.xlsx",
-        mime=(
-            "application/vnd.openxmlformats-officedocument."
-            "spreadsheetml.sheet"
-        ),
-        disabled=download_blocked_by_modal,
-        help=(
-            "Feche o aviso de atualização (Ok ou X) para liberar o download."
-            if download_blocked_by_modal
-            else None
-        ),
+    download_help = (
+        "Feche o aviso de atualização (Ok ou X) para liberar o download."
+        if download_blocked_by_modal
+        else None
     )
-
-    if missing_cells:
+    # O st.download_button guarda os bytes da planilha na memória do servidor
+    # enquanto estiver na página. Por isso a planilha só é carregada depois do
+    # clique em "Preparar download" e é liberada após o download.
+    if st.session_state.download_result_id != st.session_state.result_id:
+        if st.button(
+            "Preparar download", disabled=download_blocked_by_modal, help=download_help
+        ):
+            st.session_state.download_result_id = st.session_state.result_id
+    if st.session_state.download_result_id == st.session_state.result_id:
+        try:
+            excel_bytes = Path(result["excel_path"]).read_bytes()
+        except OSError:
+            # Outra sessão removeu o resultado (evict_results) depois do
+            # load_result.
+            excel_bytes = None
+        if excel_bytes is None:
+            st.session_state.result_id = None
+            st.session_state.download_result_id = None
+            st.info("O resultado anterior expirou. Processe o PDF novamente.")
+        else:
+            st.download_button(
+                "Baixar Planilha",
+                data=excel_bytes,
+                file_name="Planilha de Itens.xlsx",
+                mime=(
+                    "application/vnd.openxmlformats-officedocument."
+                    "spreadsheetml.sheet"
+                ),
+                on_click=_release_download,
+                disabled=download_blocked_by_modal,
+                help=download_help,
+            )
+
+    if blank_ranges:
         st.subheader("Células em branco")
-        rows_html = "".join(f"<tr><td>{cell}</td></tr>" for cell in missing_cells)
+        total_pages = max(1, math.ceil(len(blank_ranges) / BLANK_RANGES_PAGE_SIZE))
+        page = 1
+        if total_pages > 1:
+            page = st.number_input(
+                f"Página (de {total_pages})",
+                min_value=1,
+                max_value=total_pages,
+                value=1,
+                step=1,
+                key="blank_cells_page",
+            )
+        first = (page - 1) * BLANK_RANGES_PAGE_SIZE
+        rows_html = "".join(
+            "<tr><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                html.escape(str(blank.meta) or "Geral"),
+                blank.ref,
+                blank.size,
+            )
+            for blank in blank_ranges[first:first + BLANK_RANGES_PAGE_SIZE]
+        )
         st.markdown(
             f"""
             <table class="blank-cells">
-              <thead><tr><th>Célula</th></tr></thead>
+              <thead><tr><th>Meta</th><th>Células</th><th>Qtd.</th></tr></thead>
               <tbody>{rows_html}</tbody>
             </table>
             """,
@@ -1,13 +1,47 @@
 #!/usr/bin/env python3
 import argparse
+import bisect
 import copy
+import copyreg
+import functools
+import gzip
+import hashlib
+import json
+import math
+import os
+import pickle
+import queue
 import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import zipfile
+import zlib
+from collections import defaultdict, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
 from io import BytesIO
 from pathlib import Path
 
 import pdfplumber
 import openpyxl
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from pdfplumber.page import Page as PdfPlumberPage
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 from openpyxl.cell.cell import MergedCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils import column_index_from_string, get_column_letter, range_boundaries
+from openpyxl.utils.bound_dictionary import BoundDictionary
+from openpyxl.worksheet.dimensions import DimensionHolder
 
 META_HEADER_PATTERN = r"(?:A[ÇC][ÃA]O\s*/\s*)?META ESPEC[ÍI]FICA"
 # NEGATIVE LOOKAHEAD (?!\s*:) -- FIX: impede que uma menção "META ESPECÍFICA N"
@@ -71,6 +105,36 @@ ANALYSIS_BLOCK_START_ROW = 14
 ANALYSIS_BLOCK_HEIGHT = 11
 ANALYSIS_BLOCK_START_COL = 1  # A
 ANALYSIS_BLOCK_END_COL = 12  # L
+# Páginas por tarefa = total / (workers * fator); mais tarefas que workers
+# equilibra páginas "pesadas" (tabelas) entre os processos.
+EXTRACTION_CHUNKS_PER_WORKER = 4
+# Páginas já extraídas que a thread produtora pode manter à frente do parser.
+STREAM_PREFETCH_PAGES = 8
+EXCEL_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+EXCEL_CHUNK_SIZE = 64 * 1024
+EXCEL_PREFETCH_CHUNKS = 8
+# Páginas iniciais lidas por probe_pdf (assinatura do plano + camada de texto).
+PROBE_SAMPLE_PAGES = 2
+# Incrementar sempre que normalize_pdf_text/clean_lines mudarem de
+# comportamento: invalida as linhas já gravadas no cache em disco.
+NORMALIZATION_VERSION = 1
+# Incrementar quando a planilha gerada ou o resumo do resultado mudarem:
+# invalida os resultados guardados por `result_cache_key`.
+ENGINE_VERSION = 1
+CACHE_ROOT_DIR = Path(
+    os.environ.get("PLANILHA_CACHE_DIR")
+    or Path(tempfile.gettempdir()) / "preenche-planilhas-cache"
+)
+LINES_CACHE_DIR = CACHE_ROOT_DIR / "lines"
+LINES_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LINES_CACHE_SUFFIX = ".lines.gz"
+TEMPLATE_CACHE_DIR = CACHE_ROOT_DIR / "templates"
+RESULTS_DIR = CACHE_ROOT_DIR / "results"
+RESULTS_MAX_BYTES = 512 * 1024 * 1024
+RESULTS_TTL_SECONDS = 2 * 60 * 60
+RESULT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Incrementar quando o conteúdo de `describe_template_ws` mudar.
+TEMPLATE_DESCRIPTOR_VERSION = 1
 
 
 def normalize(text: str) -> str:
@@ -92,29 +156,71 @@ def strip_currency(value: str) -> str:
     return value
 
 
-def format_currency(value: str) -> str:
+NON_DIGIT_RE = re.compile(r"[^0-9]")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_currency_cents(value: str):
+    """Valor em centavos (int) de um texto como "R$ 1.234,56"; None se vazio.
+
+    Casas decimais além da segunda são descartadas, como em `format_currency`.
+    """
     value = strip_currency(value)
     if not value:
+        return None
+    integer_part, _, decimal_part = value.partition(",")
+    integer_digits = NON_DIGIT_RE.sub("", integer_part)
+    decimal_digits = NON_DIGIT_RE.sub("", decimal_part)[:2].ljust(2, "0")
+    return int(integer_digits or "0") * 100 + int(decimal_digits)
+
+
+def format_cents(cents) -> str:
+    if cents is None:
         return ""
-    if "," in value:
-        integer_part, decimal_part = value.split(",", 1)
-    else:
-        integer_part, decimal_part = value, "00"
-    integer_part = re.sub(r"[^0-9]", "", integer_part)
-    decimal_part = re.sub(r"[^0-9]", "", decimal_part)[:2].ljust(2, "0")
-    integer_part = integer_part.lstrip("0") or "0"
-    grouped = ""
-    while integer_part:
-        grouped = integer_part[-3:] + (f".{grouped}" if grouped else "")
-        integer_part = integer_part[:-3]
-    return f"R$ {grouped},{decimal_part}"
+    reais, centavos = divmod(cents, 100)
+    return f"R$ {reais:,}".replace(",", ".") + f",{centavos:02d}"
+
+
+@functools.lru_cache(maxsize=4096)
+def format_currency(value: str) -> str:
+    return format_cents(parse_currency_cents(value))
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_int(value: str):
-    digits = re.sub(r"[^0-9]", "", value or "")
+    digits = NON_DIGIT_RE.sub("", value or "")
     return int(digits) if digits else ""
 
 
+# Formato de moeda aplicado às células numéricas (modo `numeric_values`).
+CURRENCY_NUMBER_FORMAT = '"R$" #,##0.00'
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_currency_decimal(value: str):
+    """Valor como Decimal exato (ex.: Decimal("1234.56")); "" se vazio."""
+    cents = parse_currency_cents(value)
+    if cents is None:
+        return ""
+    return Decimal(cents).scaleb(-2)
+
+
+def normalize_currency_column(values, numeric=False):
+    """Formata uma coluna inteira de "Valor Total" brutos.
+
+    Valores repetidos (comuns: muitos itens com o mesmo preço) são resolvidos
+    uma única vez pelo cache de `format_currency`. Com `numeric=True` devolve
+    Decimal em vez do texto "R$ 1.234,56".
+    """
+    normalize_value = parse_currency_decimal if numeric else format_currency
+    return [normalize_value(value or "") for value in values]
+
+
+def normalize_quantity_column(values):
+    """Converte uma coluna inteira de "Qtd. Planejada" brutas em inteiros."""
+    return [parse_int(value or "") for value in values]
+
+
 def normalize_pdf_text(text: str) -> str:
     text = text.replace("\x0c", "\n")
     # FIX: (?!\s*:) evita quebrar em nova linha uma ocorrência de
@@ -150,25 +256,271 @@ def clean_lines(text: str):
     return lines
 
 
-def extract_lines_from_pdf(pdf_path: Path):
+def extract_page_lines(page):
+    text = normalize_pdf_text(page.extract_text() or "")
+    return clean_lines(text)
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+    # Sem /proc, o melhor disponível é o pico do processo inteiro.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _record_page_stats(stats, peak_rss_bytes=None):
+    stats["pages"] = stats.get("pages", 0) + 1
+    stats["peak_rss_bytes"] = max(
+        stats.get("peak_rss_bytes", 0),
+        peak_rss_bytes if peak_rss_bytes is not None else current_rss_bytes(),
+    )
+
+
+def _iter_page_lines(pages, low_memory: bool = False, stats=None):
+    for page in pages:
+        page_lines = extract_page_lines(page)
+        if low_memory:
+            # Sem isso o pdfplumber mantém chars/layout de todas as páginas
+            # até o fim do `with`, e a memória cresce com o tamanho do PDF.
+            page.close()
+        if stats is not None:
+            _record_page_stats(stats)
+        yield page_lines
+
+
+def _open_pdf_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return pdfplumber.open(BytesIO(source))
+    if hasattr(source, "read"):
+        source.seek(0)
+        return pdfplumber.open(source)
+    return pdfplumber.open(str(source))
+
+
+def _extract_page_range(source, start: int, stop: int, low_memory: bool = False):
     lines = []
-    with pdfplumber.open(str(pdf_path)) as pdf:
-        for page in pdf.pages:
-            text = normalize_pdf_text(page.extract_text() or "")
-            lines.extend(clean_lines(text))
-    return lines
+    stats = {}
+    with _open_pdf_source(source) as pdf:
+        for page_lines in _iter_page_lines(pdf.pages[start:stop], low_memory, stats):
+            lines.extend(page_lines)
+    return lines, stats.get("peak_rss_bytes", 0)
+
+
+def _split_page_ranges(page_count: int, workers: int):
+    if page_count <= 0:
+        return []
+    chunk_count = min(page_count, workers * EXTRACTION_CHUNKS_PER_WORKER)
+    chunk_size = math.ceil(page_count / chunk_count)
+    return [
+        (start, min(start + chunk_size, page_count))
+        for start in range(0, page_count, chunk_size)
+    ]
 
 
-def extract_lines_from_pdf_file(file_obj):
-    file_obj.seek(0)
+def resolve_extraction_workers(workers=None) -> int:
+    """Normaliza o número de processos de extração (0/None = todos os núcleos)."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _extract_lines_parallel(source, pdf, workers: int, low_memory: bool = False, stats=None):
+    page_count = len(pdf.pages)
+    ranges = _split_page_ranges(page_count, workers)
     lines = []
-    with pdfplumber.open(file_obj) as pdf:
-        for page in pdf.pages:
-            text = normalize_pdf_text(page.extract_text() or "")
-            lines.extend(clean_lines(text))
+    if workers <= 1 or len(ranges) <= 1:
+        for page_lines in _iter_page_lines(pdf.pages, low_memory, stats):
+            lines.extend(page_lines)
+        return lines
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        chunks = executor.map(
+            _extract_page_range,
+            [source] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+            [low_memory] * len(ranges),
+        )
+        # executor.map preserva a ordem de submissão: as linhas voltam na
+        # ordem das páginas, idênticas ao caminho serial.
+        for (start, stop), (chunk, worker_peak) in zip(ranges, chunks):
+            lines.extend(chunk)
+            if stats is not None:
+                # Pico por processo: cada worker mede a própria memória.
+                for _ in range(start, stop):
+                    _record_page_stats(stats, worker_peak)
+    if stats is not None:
+        stats["peak_rss_bytes"] = max(stats.get("peak_rss_bytes", 0), current_rss_bytes())
     return lines
 
 
+def extract_lines_from_pdf(pdf_path: Path, workers: int = 1, low_memory: bool = False, stats=None):
+    """Extrai as linhas limpas de todas as páginas do PDF.
+
+    Com `low_memory`, o layout de cada página é descartado logo após a
+    extração. Se `stats` (dict) for informado, recebe `pages` e
+    `peak_rss_bytes` (pico de memória residente observado na extração).
+    """
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        return _extract_lines_parallel(pdf_path, pdf, workers, low_memory, stats)
+
+
+def extract_lines_from_pdf_file(file_obj, workers: int = 1, low_memory: bool = False, stats=None):
+    file_obj.seek(0)
+    if workers <= 1:
+        with pdfplumber.open(file_obj) as pdf:
+            return _extract_lines_parallel(None, pdf, 1, low_memory, stats)
+    # Os processos filhos não compartilham o objeto de arquivo: cada um
+    # reabre o PDF a partir dos bytes.
+    data = file_obj.read()
+    with pdfplumber.open(BytesIO(data)) as pdf:
+        return _extract_lines_parallel(data, pdf, workers, low_memory, stats)
+
+
+_STREAM_DONE = object()
+
+
+def _produce_page_lines(source, page_queue, stop_event, low_memory, stats):
+    try:
+        with _open_pdf_source(source) as pdf:
+            for page_lines in _iter_page_lines(pdf.pages, low_memory, stats):
+                if stop_event.is_set():
+                    return
+                page_queue.put(page_lines)
+    except BaseException as exc:  # repassado ao consumidor
+        page_queue.put(exc)
+        return
+    page_queue.put(_STREAM_DONE)
+
+
+def iter_lines_from_pdf(
+    source,
+    prefetch_pages: int = STREAM_PREFETCH_PAGES,
+    low_memory: bool = False,
+    stats=None,
+):
+    """Gera as linhas limpas do PDF página a página.
+
+    `source` pode ser um caminho, bytes ou um arquivo aberto. A extração roda
+    numa thread produtora, de modo que o consumidor (ex.: `parse_items`)
+    processa as primeiras páginas enquanto as seguintes ainda são lidas.
+    `low_memory` e `stats` funcionam como em `extract_lines_from_pdf`.
+    """
+    page_queue = queue.Queue(maxsize=max(1, prefetch_pages))
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=_produce_page_lines,
+        args=(source, page_queue, stop_event, low_memory, stats),
+        daemon=True,
+    )
+    producer.start()
+    try:
+        while True:
+            page_lines = page_queue.get()
+            if page_lines is _STREAM_DONE:
+                break
+            if isinstance(page_lines, BaseException):
+                raise page_lines
+            yield from page_lines
+    finally:
+        stop_event.set()
+        # Libera a produtora caso esteja bloqueada numa fila cheia.
+        while producer.is_alive():
+            try:
+                page_queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        producer.join()
+
+
+def read_pdf_bytes(source) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return data
+    return Path(source).read_bytes()
+
+
+def pdf_cache_key(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}-n{NORMALIZATION_VERSION}"
+
+
+def _lines_cache_path(key: str, cache_dir=None) -> Path:
+    return Path(cache_dir or LINES_CACHE_DIR) / f"{key}{LINES_CACHE_SUFFIX}"
+
+
+def load_cached_lines(key: str, cache_dir=None):
+    """Retorna as linhas gravadas para `key` ou None (cache ausente/ilegível)."""
+    path = _lines_cache_path(key, cache_dir)
+    try:
+        payload = gzip.decompress(path.read_bytes()).decode("utf-8")
+        # Marca o uso recente para a política LRU.
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, UnicodeDecodeError, zlib.error):
+        # Entrada corrompida: removida para que o PDF volte a ser extraído
+        # (e regravado) em vez de falhar a cada envio.
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        return None
+    return payload.split("\n") if payload else []
+
+
+def _unique_tmp_path(path: Path) -> Path:
+    # Único por chamada: as sessões do Streamlit são threads do mesmo
+    # processo e podem gravar a mesma entrada ao mesmo tempo.
+    return path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def store_cached_lines(key: str, lines, cache_dir=None, max_bytes: int = LINES_CACHE_MAX_BYTES):
+    # clean_lines vem de splitlines(): nenhuma linha contém "\n".
+    path = _lines_cache_path(key, cache_dir)
+    payload = gzip.compress("\n".join(lines).encode("utf-8"), compresslevel=6)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _unique_tmp_path(path)
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+        evict_lines_cache(path.parent, max_bytes)
+    except OSError:
+        # Cache é só otimização: falha de disco não interrompe o processamento.
+        return
+
+
+def evict_lines_cache(cache_dir=None, max_bytes: int = LINES_CACHE_MAX_BYTES):
+    """Remove as entradas menos usadas até o cache caber em `max_bytes`."""
+    entries = []
+    total = 0
+    for path in Path(cache_dir or LINES_CACHE_DIR).glob(f"*{LINES_CACHE_SUFFIX}"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
 def extract_plan_signature(lines):
     max_lines = min(len(lines), 120)
     for idx in range(max_lines):
@@ -185,6 +537,48 @@ def extract_plan_signature(lines):
     return {"sigla": None, "ano": None, "raw_line": None}
 
 
+def _pdf_page_count(pdf) -> int:
+    # /Count da árvore de páginas vem do catálogo (via trailer): evita
+    # percorrer todas as páginas só para contá-las.
+    try:
+        count = resolve1(resolve1(pdf.doc.catalog["Pages"])["Count"])
+        if isinstance(count, int) and count >= 0:
+            return count
+    except (KeyError, TypeError):
+        pass
+    return len(pdf.pages)
+
+
+def probe_pdf(source, sample_pages: int = PROBE_SAMPLE_PAGES):
+    """Inspeção rápida do PDF sem extrair o documento inteiro.
+
+    Lê apenas as primeiras `sample_pages` páginas e o catálogo. Retorna a
+    assinatura do plano (sigla/ano, como `extract_plan_signature`), o total
+    de páginas e, para cada página amostrada, se ela tem camada de texto.
+    """
+    text_layer = []
+    sample_lines = []
+    with _open_pdf_source(source) as pdf:
+        page_count = _pdf_page_count(pdf)
+        doctop = 0
+        page_objs = PDFPage.create_pages(pdf.doc)
+        for page_number, page_obj in enumerate(page_objs, start=1):
+            if page_number > sample_pages:
+                break
+            page = PdfPlumberPage(pdf, page_obj, page_number=page_number, initial_doctop=doctop)
+            doctop += page.height
+            text_layer.append(bool(page.chars))
+            sample_lines.extend(extract_page_lines(page))
+            page.close()
+    signature = extract_plan_signature(sample_lines)
+    return {
+        **signature,
+        "page_count": page_count,
+        "text_layer": text_layer,
+        "has_text": any(text_layer),
+    }
+
+
 def resolve_art_by_plan_rule(sigla, ano):
     if not sigla or not ano:
         return None
@@ -222,15 +616,111 @@ def resolve_action_header_title_by_plan(sigla, ano):
     )
 
 
+# Templates já carregados neste processo, por (caminho, mtime, tamanho).
+TEMPLATE_SNAPSHOT_MAX_ENTRIES = 8
+_TEMPLATE_SNAPSHOTS = {}
+# Um único lock para os caches de template (snapshots, descritores e
+# digests), compartilhados pelas threads das sessões do app.
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def _template_cache_key(template_path):
+    path = Path(template_path)
+    stat = path.stat()
+    return (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def _template_cache_get(cache, key):
+    with _TEMPLATE_CACHE_LOCK:
+        return cache.get(key)
+
+
+def _template_cache_put(cache, key, value, max_entries=None):
+    with _TEMPLATE_CACHE_LOCK:
+        # Versões antigas do mesmo arquivo (mtime diferente) saem do cache.
+        for stale in [k for k in cache if k[0] == key[0]]:
+            del cache[stale]
+        while max_entries and len(cache) >= max_entries:
+            del cache[next(iter(cache))]
+        cache[key] = value
+
+
+def _new_bound_dictionary(cls, default_factory):
+    obj = cls.__new__(cls)
+    defaultdict.__init__(obj, default_factory)
+    return obj
+
+
+def _reduce_bound_dictionary(obj):
+    # O reduce padrão de defaultdict passa default_factory como primeiro
+    # argumento de __init__, que nestas classes é outro parâmetro: a cópia
+    # perderia a fábrica das dimensões de linha/coluna.
+    return (
+        _new_bound_dictionary,
+        (type(obj), obj.default_factory),
+        obj.__dict__,
+        None,
+        iter(obj.items()),
+    )
+
+
+class _WorkbookPickler(pickle.Pickler):
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[BoundDictionary] = _reduce_bound_dictionary
+    dispatch_table[DimensionHolder] = _reduce_bound_dictionary
+
+
+def _dump_workbook(workbook) -> bytes:
+    buffer = BytesIO()
+    _WorkbookPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(workbook)
+    return buffer.getvalue()
+
+
+class _TemplateSnapshot:
+    """Template lido uma única vez e guardado só serializado (`payload`).
+
+    Nenhum workbook vivo é compartilhado entre threads: até as consultas do
+    openpyxl criam células (`ws["A2"]`, `ws[linha]`), então cada uso recebe a
+    sua cópia independente.
+    """
+
+    __slots__ = ("payload",)
+
+    def __init__(self, workbook):
+        self.payload = _dump_workbook(workbook)
+
+    def clone(self):
+        return pickle.loads(self.payload)
+
+
+def _template_snapshot(template_path) -> _TemplateSnapshot:
+    key = _template_cache_key(template_path)
+    snapshot = _template_cache_get(_TEMPLATE_SNAPSHOTS, key)
+    if snapshot is None:
+        snapshot = _TemplateSnapshot(openpyxl.load_workbook(template_path))
+        _template_cache_put(
+            _TEMPLATE_SNAPSHOTS, key, snapshot, max_entries=TEMPLATE_SNAPSHOT_MAX_ENTRIES
+        )
+    return snapshot
+
+
+def load_template_workbook(template_path):
+    """Cópia independente do template, pronta para ser preenchida."""
+    return _template_snapshot(template_path).clone()
+
+
+def _template_worksheet(template_path):
+    # Cópia própria: as consultas podem criar células na planilha.
+    return load_template_workbook(template_path).active
+
+
 def is_analysis_template_sheet(ws) -> bool:
     title = normalize(str(ws["A2"].value or "")).upper()
     return ANALYSIS_TEMPLATE_TITLE in title
 
 
 def is_analysis_template_file(template_path: Path) -> bool:
-    wb = openpyxl.load_workbook(template_path)
-    ws = wb.active
-    return is_analysis_template_sheet(ws)
+    return template_descriptor(template_path)["analysis"]
 
 
 def _header_key(header: str) -> str:
@@ -238,8 +728,7 @@ def _header_key(header: str) -> str:
 
 
 def get_template_header_info_by_row(template_path: Path, header_row: int):
-    wb = openpyxl.load_workbook(template_path)
-    ws = wb.active
+    ws = _template_worksheet(template_path)
     return get_header_info_from_ws(ws, header_row)
 
 
@@ -256,53 +745,158 @@ def get_header_info_from_ws(ws, header_row: int):
     return headers, header_map
 
 
-def parse_items(lines):
-    items = []
-    current_meta = None
-    current_item = None
-    current_status = None
-    current_lines = []
-
-    def flush():
-        nonlocal current_item, current_lines, current_status
-        if current_meta is None or current_item is None:
-            return
-        items.append({
-            "meta": current_meta,
-            "item": current_item,
-            "status": current_status or "",
-            "lines": current_lines[:],
-        })
-        current_item = None
-        current_status = None
-        current_lines = []
+class _Record(Mapping):
+    """Registro compacto (__slots__) com leitura no estilo dict.
 
-    for line in lines:
-        meta_match = META_RE.match(line)
-        if meta_match:
-            flush()
-            current_meta = int(meta_match.group(1))
-            continue
-        item_match = ITEM_RE.match(line)
-        if item_match:
+    `FIELDS` mapeia a chave pública (a mesma dos antigos dicts, ex.: o texto
+    do cabeçalho da planilha) para o atributo; `get`, `in`, `keys`, `items` e
+    atribuição por chave continuam funcionando para quem consumia dicts.
+    """
+
+    __slots__ = ()
+    FIELDS = {}
+
+    def __init__(self, **values):
+        for key, attr in self.FIELDS.items():
+            setattr(self, attr, values.get(attr, ""))
+
+    def __getitem__(self, key):
+        attr = self.FIELDS.get(key)
+        if attr is None:
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def __setitem__(self, key, value):
+        attr = self.FIELDS.get(key)
+        if attr is None:
+            raise KeyError(key)
+        setattr(self, attr, value)
+
+    def get(self, key, default=None):
+        attr = self.FIELDS.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __getstate__(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr, value in zip(self.__slots__, state):
+            setattr(self, attr, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+class ItemRecord(_Record):
+    __slots__ = ("meta", "item", "status", "source", "spans")
+    FIELDS = {name: name for name in __slots__}
+
+
+class _ItemCollector:
+    """Máquina de estados de `parse_items`, alimentada linha a linha.
+
+    Os itens não copiam suas linhas: guardam a lista do documento (`source`)
+    e offsets `spans` = (início, fim[, início, fim...]) nela; o texto só é
+    materializado por `item_lines`.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.meta = None
+        self.item = None
+        self.status = None
+        self.start = 0
+        self.spans = []
+
+    def _flush(self, end: int):
+        if self.meta is None or self.item is None:
+            return None
+        item = ItemRecord(
+            meta=self.meta,
+            item=self.item,
+            status=self.status or "",
+            source=self.source,
+            spans=(*self.spans, self.start, end),
+        )
+        self.item = None
+        self.status = None
+        self.spans = []
+        return item
+
+    def feed(self, idx: int, tag):
+        """Processa a linha `idx`; devolve o item que ela fechou, se houver."""
+        if tag.kind == LINE_META:
+            item = self._flush(idx)
+            if self.item is not None:
+                # Item aberto antes do primeiro cabeçalho de meta: ele segue
+                # aberto, mas a linha da meta não faz parte do seu texto.
+                self.spans += (self.start, idx)
+                self.start = idx + 1
+            self.meta = tag.key
+            return item
+        if tag.kind == LINE_ITEM:
             # Lines like "item 42 (Desenvolvimento de...)" that appear in the
             # strategy/description prose have no status token.  Real item
             # headers always carry one of Aprovado / Cancelado / Planejado.
             # Skip matches without a status to avoid false triggers.
-            if not item_match.group(2):
-                if current_item is not None:
-                    current_lines.append(line)
-                continue
-            flush()
-            current_item = int(item_match.group(1))
-            current_status = (item_match.group(2) or "").capitalize()
-            current_lines = []
-            continue
-        if current_item is not None:
-            current_lines.append(line)
+            if not tag.payload:
+                return None
+            item = self._flush(idx)
+            self.item = tag.key
+            self.status = tag.payload
+            self.start = idx + 1
+            self.spans = []
+            return item
+        return None
+
+    def finish(self):
+        return self._flush(len(self.source))
+
+
+def item_lines(item):
+    """Linhas do item, materializadas a partir dos offsets na lista do documento."""
+    if "lines" in item:
+        return item["lines"]
+    lines = item["source"]
+    spans = item["spans"]
+    if len(spans) == 2:
+        return lines[spans[0]:spans[1]]
+    return [
+        line
+        for pos in range(0, len(spans), 2)
+        for line in lines[spans[pos]:spans[pos + 1]]
+    ]
+
+
+def iter_parse_items(lines):
+    """Versão geradora de `parse_items`: cada item é emitido assim que fecha.
+
+    Aceita qualquer iterável de linhas, inclusive `iter_lines_from_pdf`.
+    """
+    source = lines if isinstance(lines, list) else []
+    collector = _ItemCollector(source)
+    for idx, line in enumerate(lines):
+        if source is not lines:
+            source.append(line)
+        item = collector.feed(idx, classify_line(line))
+        if item is not None:
+            yield item
+    item = collector.finish()
+    if item is not None:
+        yield item
+
 
-    flush()
-    return items
+def parse_items(lines):
+    return list(iter_parse_items(lines))
 
 
 META_GERAL_LINE_RE = re.compile(r"^Meta Geral$", re.IGNORECASE)
@@ -354,16 +948,95 @@ PERIODICIDADE_FONTE_INLINE_RE = re.compile(
 )
 
 
-def extract_meta_geral(lines) -> str:
-    for idx, line in enumerate(lines):
-        if META_GERAL_LINE_RE.match(line):
-            collected = []
-            for next_line in lines[idx + 1:]:
-                if re.match(rf"^(Justificativa|Indicador Geral de Resultado|{META_HEADER_PATTERN})", next_line, re.IGNORECASE):
-                    break
-                collected.append(next_line)
-            return blank_if_dash_only(" ".join(collected))
-    return ""
+# Prefixos de linha que iniciam/encerram as coletas de Meta Geral, Indicador
+# Geral e Valor de Referência (ver _AnalysisMarkerIndex).
+ANALYSIS_PREFIX_RE = re.compile(
+    rf"^(?:(?P<meta_especifica>{META_HEADER_PATTERN})"
+    r"|(?P<meta_geral>Meta Geral)"
+    r"|(?P<justificativa>Justificativa)"
+    r"|(?P<indicador_geral>Indicador Geral de Resultado)"
+    r"|(?P<descricao_indicador>Descri[cç][aã]o do Indicador:)"
+    r"|(?P<itens_da_meta>Itens da Meta)"
+    r"|(?P<status>Status:))",
+    re.IGNORECASE,
+)
+META_GERAL_STOP_PREFIXES = frozenset({"meta_especifica", "justificativa", "indicador_geral"})
+VALOR_REFERENCIA_STOP_PREFIXES = frozenset(
+    {"meta_especifica", "descricao_indicador", "itens_da_meta", "status"}
+)
+STATUS_LINE_RE = re.compile(r"^Status:", re.IGNORECASE)
+ITENS_DA_META_LINE_RE = re.compile(r"^Itens da Meta$", re.IGNORECASE)
+
+# Tipos de linha atribuídos por classify_line. Os padrões abaixo são
+# mutuamente exclusivos, então uma única classificação serve a todos os
+# parsers: cada um trata os tipos que não lhe interessam como texto comum.
+LINE_TEXT = "text"
+LINE_META = "meta"
+LINE_ITEM = "item"
+LINE_STOP = "stop"
+LINE_ACTION = "acao"
+LINE_ART = "art"
+LINE_FIELD = "field"
+LINE_STATUS = "status"
+LINE_ITENS_DA_META = "itens_da_meta"
+LINE_SECTION_LABEL = "section_label"
+
+# kind: um dos LINE_*; key: número da meta/item, número do artigo ou nome
+# do campo; payload: status do item ou conteúdo após o rótulo.
+LineTag = namedtuple("LineTag", ("kind", "key", "payload"))
+TEXT_TAG = LineTag(LINE_TEXT, None, None)
+
+
+def _build_line_classifier():
+    # Ordem de prioridade idêntica à dos laços originais de cada parser.
+    alternatives = [(LINE_META, None, META_RE), (LINE_ITEM, None, ITEM_RE)]
+    alternatives += [(LINE_STOP, None, pattern) for pattern in STOP_PATTERNS]
+    alternatives += [(LINE_ACTION, "acao", ACTION_PATTERN), (LINE_ART, None, ART_PATTERN)]
+    alternatives += [(LINE_FIELD, field, pattern) for field, pattern in CAPTURE_PATTERNS]
+    alternatives += [
+        (LINE_STATUS, None, STATUS_LINE_RE),
+        (LINE_ITENS_DA_META, None, ITENS_DA_META_LINE_RE),
+    ]
+    alternatives += [
+        (LINE_SECTION_LABEL, field, pattern) for field, pattern in SECTION_LABEL_PATTERNS
+    ]
+    parts = []
+    group_specs = {}
+    group_index = 1
+    for kind, key, pattern in alternatives:
+        source = pattern.pattern
+        if source.startswith("^"):
+            source = source[1:]
+        parts.append(f"({source})")
+        # Grupos internos de cada padrão vêm logo após o grupo externo.
+        group_specs[group_index] = (kind, key, group_index + 1)
+        group_index += 1 + pattern.groups
+    return re.compile("^(?:" + "|".join(parts) + ")", re.IGNORECASE), group_specs
+
+
+LINE_CLASSIFIER_RE, _LINE_CLASSIFIER_GROUPS = _build_line_classifier()
+
+
+@functools.lru_cache(maxsize=8192)
+def classify_line(line: str) -> LineTag:
+    """Classifica a linha com uma única busca regex (resultado memoizado)."""
+    match = LINE_CLASSIFIER_RE.match(line)
+    if not match:
+        return TEXT_TAG
+    kind, key, first = _LINE_CLASSIFIER_GROUPS[match.lastindex]
+    if kind == LINE_META:
+        return LineTag(kind, int(match.group(first)), None)
+    if kind == LINE_ITEM:
+        return LineTag(kind, int(match.group(first)), (match.group(first + 1) or "").capitalize())
+    if kind == LINE_ART:
+        return LineTag(kind, match.group(first), match.group(first + 2).strip())
+    if kind in (LINE_ACTION, LINE_FIELD, LINE_SECTION_LABEL):
+        return LineTag(kind, key, match.group(first).strip())
+    return LineTag(kind, None, None)
+
+
+def classify_lines(lines):
+    return [classify_line(line) for line in lines]
 
 
 def _extract_text_after_marker(line: str, marker_pattern) -> str:
@@ -373,104 +1046,221 @@ def _extract_text_after_marker(line: str, marker_pattern) -> str:
     return blank_if_dash_only((line or "")[match.end():].lstrip(" :;-"))
 
 
-def extract_indicador_geral_completo(lines) -> str:
-    for idx, line in enumerate(lines):
-        has_indicator_marker = bool(INDICADOR_GERAL_MARKER_RE.search(line or ""))
-        is_indicator_header = bool(INDICADOR_GERAL_LINE_RE.match(line or ""))
-        is_meta_inline_indicator = bool(
-            re.match(r"^Meta Geral\s*:", line or "", re.IGNORECASE)
-            and has_indicator_marker
-        )
-        if not (is_indicator_header or is_meta_inline_indicator):
+def _next_position(positions, after: int, default: int) -> int:
+    pos = bisect.bisect_right(positions, after)
+    return positions[pos] if pos < len(positions) else default
+
+
+class _AnalysisMarkerIndex:
+    """Posições dos marcadores usados por Meta Geral, Indicador Geral e
+    Valor de Referência, montadas numa única passada pelas linhas.
+
+    Cada coleta começa no marcador e termina na próxima linha de parada
+    (obtida por bisect), sem copiar a cauda da lista nem reescanear o
+    documento a cada candidato.
+    """
+
+    def __init__(self):
+        self.meta_geral = None
+        self.valor_referencia = None
+        self.indicador_starts = []
+        self.meta_geral_stops = []
+        self.valor_referencia_stops = []
+        self.indicador_stops = []
+
+    def feed(self, idx: int, line: str):
+        if self.valor_referencia is None and VALOR_REFERENCIA_RE.search(line):
+            self.valor_referencia = idx
+        prefix = ANALYSIS_PREFIX_RE.match(line)
+        if not prefix:
+            return
+        kind = prefix.lastgroup
+        if kind in META_GERAL_STOP_PREFIXES:
+            self.meta_geral_stops.append(idx)
+        if kind in VALOR_REFERENCIA_STOP_PREFIXES:
+            self.valor_referencia_stops.append(idx)
+        if kind == "meta_especifica":
+            self.indicador_stops.append(idx)
+        elif kind == "meta_geral":
+            if self.meta_geral is None and META_GERAL_LINE_RE.match(line):
+                self.meta_geral = idx
+            if (
+                re.match(r"^Meta Geral\s*:", line, re.IGNORECASE)
+                and INDICADOR_GERAL_MARKER_RE.search(line)
+            ):
+                self.indicador_starts.append(idx)
+            if not _extract_text_after_marker(line, INDICADOR_GERAL_MARKER_RE):
+                self.indicador_stops.append(idx)
+        elif kind == "indicador_geral":
+            if INDICADOR_GERAL_LINE_RE.match(line):
+                self.indicador_starts.append(idx)
+        elif kind in ("itens_da_meta", "status"):
+            if not INDICADOR_GERAL_MARKER_RE.search(line):
+                self.indicador_stops.append(idx)
+
+    def meta_geral_text(self, lines) -> str:
+        if self.meta_geral is None:
+            return ""
+        stop = _next_position(self.meta_geral_stops, self.meta_geral, len(lines))
+        return blank_if_dash_only(" ".join(lines[self.meta_geral + 1:stop]))
+
+    def valor_referencia_text(self, lines) -> str:
+        idx = self.valor_referencia
+        if idx is None:
+            return ""
+        line = lines[idx]
+        stop = _next_position(self.valor_referencia_stops, idx, len(lines))
+        collected = [line[VALOR_REFERENCIA_RE.search(line).start():].strip()]
+        collected.extend(lines[idx + 1:stop])
+        return blank_if_dash_only(" ".join(collected))
+
+    def indicador_geral_text(self, lines) -> str:
+        starts = set(self.indicador_starts)
+        proven_empty = set()
+        for idx in self.indicador_starts:
+            if idx in proven_empty:
+                continue
+            stop = _next_position(self.indicador_stops, idx, len(lines))
+            indicador, neutral_starts = _collect_indicador_geral(lines, idx, stop, starts)
+            if indicador:
+                return indicador
+            # Um candidato alcançado por uma coleta vazia, fora de bloco "EX:",
+            # continuaria exatamente a mesma coleta: também sairia vazio.
+            proven_empty.update(neutral_starts)
+        return ""
+
+
+def _collect_indicador_geral(lines, idx: int, stop: int, starts=()):
+    collected = []
+    neutral_starts = []
+    inline = _extract_text_after_marker(lines[idx], INDICADOR_GERAL_MARKER_RE)
+    if inline:
+        collected.append(inline)
+    skip_ex_block = False
+    # As linhas de parada (cabeçalho de meta, "Meta Geral" sem indicador,
+    # "Itens da Meta"/"Status:") já estão em `stop`.
+    for pos in range(idx + 1, stop):
+        next_line = lines[pos]
+        if pos in starts and not skip_ex_block:
+            neutral_starts.append(pos)
+        if re.match(r"^Meta Geral", next_line, re.IGNORECASE):
+            collected.append(
+                _extract_text_after_marker(next_line, INDICADOR_GERAL_MARKER_RE)
+            )
             continue
-        collected = []
-        inline = _extract_text_after_marker(line, INDICADOR_GERAL_MARKER_RE)
-        if inline:
-            collected.append(inline)
-        skip_ex_block = False
-        for next_line in lines[idx + 1:]:
-            if re.match(rf"^{META_HEADER_PATTERN}", next_line, re.IGNORECASE):
-                break
-            if re.match(r"^Meta Geral", next_line, re.IGNORECASE):
-                inline_meta = _extract_text_after_marker(
-                    next_line, INDICADOR_GERAL_MARKER_RE
-                )
-                if inline_meta:
-                    collected.append(inline_meta)
-                    continue
-                break
-            if INDICADOR_GERAL_MARKER_RE.search(next_line):
-                inline_next = _extract_text_after_marker(
-                    next_line, INDICADOR_GERAL_MARKER_RE
-                )
-                if inline_next:
-                    collected.append(inline_next)
+        if INDICADOR_GERAL_MARKER_RE.search(next_line):
+            inline_next = _extract_text_after_marker(
+                next_line, INDICADOR_GERAL_MARKER_RE
+            )
+            if inline_next:
+                collected.append(inline_next)
+            continue
+        # Skip the entire example block that starts with "EX:".
+        # The block ends when we see a line that looks like real content
+        # (starts with a recognisable field label such as "Indicador:" or
+        # "Fórmula de Cálculo:").
+        if re.match(r"^EX\s*:", next_line, re.IGNORECASE):
+            skip_ex_block = True
+            continue
+        if skip_ex_block:
+            # FIX: a line ending in ")" closes the EX parenthetical
+            # example — turn off the skip flag so the REAL value that
+            # follows (e.g. "Não se aplica.") is not swallowed too.
+            # The closing line itself is still example content, so it
+            # is not appended.
+            if next_line.rstrip().endswith(")"):
+                skip_ex_block = False
                 continue
-            if re.match(r"^(Itens da Meta|Status:)", next_line, re.IGNORECASE):
-                break
-            # Skip the entire example block that starts with "EX:".
-            # The block ends when we see a line that looks like real content
-            # (starts with a recognisable field label such as "Indicador:" or
-            # "Fórmula de Cálculo:").
-            if re.match(r"^EX\s*:", next_line, re.IGNORECASE):
-                skip_ex_block = True
+            # A line that closes a parenthesis block is still part of EX.
+            if re.match(r"^[^A-Za-záéíóúàâãêôçÁÉÍÓÚÀÂÃÊÔÇ]", next_line):
                 continue
-            if skip_ex_block:
-                # FIX: a line ending in ")" closes the EX parenthetical
-                # example — turn off the skip flag so the REAL value that
-                # follows (e.g. "Não se aplica.") is not swallowed too.
-                # The closing line itself is still example content, so it
-                # is not appended.
-                if next_line.rstrip().endswith(")"):
-                    skip_ex_block = False
-                    continue
-                # A line that closes a parenthesis block is still part of EX.
-                if re.match(r"^[^A-Za-záéíóúàâãêôçÁÉÍÓÚÀÂÃÊÔÇ]", next_line):
-                    continue
-                # A line that begins a real labelled field ends the EX block.
-                if re.match(
-                    r"^(Indicador|F[oó]rmula|Valor de Refer|Descri[cç][aã]o|Periodicidade|Fonte)",
-                    next_line,
-                    re.IGNORECASE,
-                ):
-                    skip_ex_block = False
-                else:
-                    # Heuristic: the EX block closes with a ")" — once we pass
-                    # it any remaining continuation lines are also skipped.
-                    continue
-            collected.append(next_line)
-        indicador = blank_if_dash_only(" ".join(collected))
-        if indicador:
-            return indicador
-    return ""
+            # A line that begins a real labelled field ends the EX block.
+            if re.match(
+                r"^(Indicador|F[oó]rmula|Valor de Refer|Descri[cç][aã]o|Periodicidade|Fonte)",
+                next_line,
+                re.IGNORECASE,
+            ):
+                skip_ex_block = False
+            else:
+                # Heuristic: the EX block closes with a ")" — once we pass
+                # it any remaining continuation lines are also skipped.
+                continue
+        collected.append(next_line)
+    return blank_if_dash_only(" ".join(collected)), neutral_starts
 
 
-def extract_indicador_geral_valor_referencia(lines) -> str:
+def _index_analysis_markers(lines):
+    markers = _AnalysisMarkerIndex()
     for idx, line in enumerate(lines):
-        marker_match = VALOR_REFERENCIA_RE.search(line)
-        if not marker_match:
-            continue
-        collected = [line[marker_match.start():].strip()]
-        for next_line in lines[idx + 1:]:
-            if re.match(rf"^({META_HEADER_PATTERN}|Descri[cç][aã]o do Indicador:|Itens da Meta|Status:)", next_line, re.IGNORECASE):
-                break
-            collected.append(next_line)
-        return blank_if_dash_only(" ".join(collected))
-    return ""
+        markers.feed(idx, line)
+    return markers
+
+
+def extract_meta_geral(lines) -> str:
+    return _index_analysis_markers(lines).meta_geral_text(lines)
+
+
+def extract_indicador_geral_completo(lines) -> str:
+    return _index_analysis_markers(lines).indicador_geral_text(lines)
+
+
+def extract_indicador_geral_valor_referencia(lines) -> str:
+    return _index_analysis_markers(lines).valor_referencia_text(lines)
 
 
 def extract_analysis_data(lines):
-    return {
-        "zero_indicador_geral": extract_indicador_geral_completo(lines),
-        "one_meta_geral": extract_meta_geral(lines),
-        "three_valor_referencia": extract_indicador_geral_valor_referencia(lines),
-        "sections": extract_meta_especifica_sections(lines),
-    }
+    return parse_document(lines, with_items=False)["analysis"]
 
 
-def _finalize_meta_section(section):
-    result = {"numero_meta": section["numero_meta"]}
-    for key in (
+def parse_document(lines, with_items: bool = True, with_analysis: bool = True):
+    """Percorre o documento uma única vez e devolve itens e dados de análise.
+
+    Itens e seções de Meta Específica saem de máquinas de estado alimentadas
+    na mesma passada. Para Meta Geral, Indicador Geral e Valor de Referência
+    a passada só registra onde cada marcador aparece; o texto é coletado a
+    partir dessas posições. Aceita lista ou iterável de linhas (ex.:
+    `iter_lines_from_pdf`); o resultado traz `lines`, `items` e `analysis`
+    (mesmo formato de `extract_analysis_data`, ou None).
+    """
+    # Iteráveis (ex.: extração em streaming) são acumulados aqui: as coletas
+    # da análise e os offsets dos itens apontam para esta lista.
+    source = lines if isinstance(lines, list) else []
+    items = []
+    item_collector = _ItemCollector(source) if with_items else None
+    section_collector = _MetaSectionCollector() if with_analysis else None
+    markers = _AnalysisMarkerIndex() if with_analysis else None
+
+    for idx, line in enumerate(lines):
+        if source is not lines:
+            source.append(line)
+        tag = classify_line(line)
+        if item_collector is not None:
+            item = item_collector.feed(idx, tag)
+            if item is not None:
+                items.append(item)
+        if section_collector is not None:
+            section_collector.feed(line, tag)
+            markers.feed(idx, line)
+
+    if item_collector is not None:
+        item = item_collector.finish()
+        if item is not None:
+            items.append(item)
+
+    analysis = None
+    if section_collector is not None:
+        analysis = {
+            "zero_indicador_geral": markers.indicador_geral_text(source),
+            "one_meta_geral": markers.meta_geral_text(source),
+            "three_valor_referencia": markers.valor_referencia_text(source),
+            "sections": section_collector.finish(),
+        }
+    return {"lines": source, "items": items, "analysis": analysis}
+
+
+class MetaSectionRecord(_Record):
+    __slots__ = (
+        "numero_meta",
         "meta_texto",
         "descricao_indicador",
         "formula",
@@ -479,7 +1269,13 @@ def _finalize_meta_section(section):
         "carteira_mjsp",
         "periodicidade",
         "fonte_ano",
-    ):
+    )
+    FIELDS = {name: name for name in __slots__}
+
+
+def _finalize_meta_section(section):
+    result = MetaSectionRecord(numero_meta=section["numero_meta"])
+    for key in MetaSectionRecord.__slots__[1:]:
         result[key] = blank_if_dash_only(" ".join(section.get(key, [])))
     return result
 
@@ -522,18 +1318,20 @@ def _trim_meta_pesp(text: str) -> str:
     return blank_if_dash_only(text)
 
 
-def extract_meta_especifica_sections(lines):
-    sections = []
-    current = None
-    current_field = None
+class _MetaSectionCollector:
+    """Máquina de estados de `extract_meta_especifica_sections`."""
 
-    for line in lines:
-        meta_match = META_ESPECIFICA_LINE_RE.match(line)
-        if meta_match:
-            if current is not None:
-                sections.append(current)
-            current = {
-                "numero_meta": int(meta_match.group(1)),
+    def __init__(self):
+        self.sections = []
+        self.current = None
+        self.current_field = None
+
+    def feed(self, line, tag):
+        if tag.kind == LINE_META:
+            if self.current is not None:
+                self.sections.append(self.current)
+            self.current = {
+                "numero_meta": tag.key,
                 "meta_texto": [],
                 "descricao_indicador": [],
                 "formula": [],
@@ -547,129 +1345,157 @@ def extract_meta_especifica_sections(lines):
                 "saw_formula": False,
                 "saw_carteira_mjsp": False,
             }
-            current_field = "meta_texto"
-            continue
+            self.current_field = "meta_texto"
+            return
 
+        current = self.current
         if current is None:
-            continue
+            return
 
-        if re.match(r"^Status:", line, re.IGNORECASE):
+        if tag.kind == LINE_STATUS:
             current["saw_status"] = True
-            current_field = None
-            continue
-        if re.match(r"^Itens da Meta$", line, re.IGNORECASE):
-            current_field = None
-            continue
-        if ITEM_RE.match(line):
-            current_field = None
-            continue
+            self.current_field = None
+            return
+        if tag.kind in (LINE_ITENS_DA_META, LINE_ITEM):
+            self.current_field = None
+            return
 
-        matched_label = False
-        for field_key, pattern in SECTION_LABEL_PATTERNS:
-            match = pattern.match(line)
-            if match:
-                current_field = field_key
-                flag_key = FIELD_TO_FLAG.get(field_key)
-                if flag_key:
-                    current[flag_key] = True
-                content = match.group(1).strip()
-                if content:
-                    if field_key == "periodicidade":
-                        fonte_inline = PERIODICIDADE_FONTE_INLINE_RE.search(content)
-                        if fonte_inline:
-                            periodicidade_value = content[:fonte_inline.start()].strip()
-                            fonte_value = fonte_inline.group(1).strip()
-                            if periodicidade_value:
-                                current[field_key].append(periodicidade_value)
-                            if fonte_value:
-                                current["fonte_ano"].append(fonte_value)
-                            matched_label = True
-                            break
+        if tag.kind == LINE_SECTION_LABEL:
+            field_key = tag.key
+            self.current_field = field_key
+            flag_key = FIELD_TO_FLAG.get(field_key)
+            if flag_key:
+                current[flag_key] = True
+            content = tag.payload
+            if content:
+                fonte_inline = (
+                    PERIODICIDADE_FONTE_INLINE_RE.search(content)
+                    if field_key == "periodicidade"
+                    else None
+                )
+                if fonte_inline:
+                    periodicidade_value = content[:fonte_inline.start()].strip()
+                    fonte_value = fonte_inline.group(1).strip()
+                    if periodicidade_value:
+                        current[field_key].append(periodicidade_value)
+                    if fonte_value:
+                        current["fonte_ano"].append(fonte_value)
+                else:
                     current[field_key].append(content)
-                matched_label = True
-                break
-        if matched_label:
-            continue
-
-        if current_field:
-            current[current_field].append(line)
+            return
 
-    if current is not None:
-        sections.append(current)
+        if self.current_field:
+            current[self.current_field].append(line)
 
-    finalized_sections = [_finalize_meta_section(section) for section in sections]
-    finalized_sections = _dedupe_sections_keep_last(finalized_sections)
+    def finish(self):
+        sections = self.sections
+        if self.current is not None:
+            sections.append(self.current)
+            self.current = None
 
-    technical_sections = [
-        _finalize_meta_section(section)
-        for section in sections
-        if _is_technical_meta_section(section)
-    ]
-    technical_sections = _dedupe_sections_keep_last(technical_sections)
+        finalized_sections = [_finalize_meta_section(section) for section in sections]
+        finalized_sections = _dedupe_sections_keep_last(finalized_sections)
 
-    merged_sections = _merge_sections_prefer_technical(
-        finalized_sections, technical_sections
-    )
+        technical_sections = [
+            _finalize_meta_section(section)
+            for section in sections
+            if _is_technical_meta_section(section)
+        ]
+        technical_sections = _dedupe_sections_keep_last(technical_sections)
 
-    for section in merged_sections:
-        section["meta_pesp"] = _trim_meta_pesp(section.get("meta_pesp", ""))
-    return merged_sections
+        merged_sections = _merge_sections_prefer_technical(
+            finalized_sections, technical_sections
+        )
 
+        for section in merged_sections:
+            section["meta_pesp"] = _trim_meta_pesp(section.get("meta_pesp", ""))
+        return merged_sections
 
-def extract_fields(item_lines):
-    fields = {key: [] for key, _ in CAPTURE_PATTERNS}
-    fields["acao"] = []
-    fields["art"] = []
-    fields["art_num"] = ""
-    current_field = None
 
-    for line in item_lines:
-        matched = False
-        for stop in STOP_PATTERNS:
-            if stop.match(line):
-                current_field = None
-                matched = True
-                break
-        if matched:
-            continue
+def extract_meta_especifica_sections(lines):
+    collector = _MetaSectionCollector()
+    for line in lines:
+        collector.feed(line, classify_line(line))
+    return collector.finish()
 
-        action_match = ACTION_PATTERN.match(line)
-        if action_match:
-            current_field = "acao"
-            action_body = action_match.group(1).strip()
-            if action_body:
-                fields[current_field].append(action_body)
-            continue
 
-        art_match = ART_PATTERN.match(line)
-        if art_match:
-            current_field = "art"
-            art_num = art_match.group(1)
-            art_body = art_match.group(3).strip()
-            if art_body:
-                fields[current_field].append(art_body)
-            fields["art_num"] = art_num
-            continue
+ITEM_FIELD_NAMES = tuple(dict.fromkeys(key for key, _ in CAPTURE_PATTERNS)) + (
+    "acao",
+    "art",
+    "art_num",
+)
 
-        for field, pattern in CAPTURE_PATTERNS:
-            match = pattern.match(line)
-            if match:
-                current_field = field
-                content = match.group(1).strip()
-                if content:
-                    fields[current_field].append(content)
-                matched = True
-                break
-        if matched:
-            continue
+# Campos de `extract_fields` que cada coluna da planilha consome em `build_rows`.
+HEADER_FIELD_DEPENDENCIES = {
+    ACTION_HEADER_KEY: ("acao", "art", "art_num"),
+    ACTION_HEADER_NUM_KEY: ("art_num",),
+    "Material/Serviço": ("bem",),
+    "Descrição": ("descricao",),
+    "Destinação": ("destinacao",),
+    "Instituição": ("instituicao",),
+    "Natureza da Despesa": ("natureza",),
+    "Quantidade Planejada": ("quantidade",),
+    "Unidade de Medida": ("unidade",),
+    "Quantidade/Unidade": ("quantidade", "unidade"),
+    "Valor Planejado Total": ("valor_total",),
+    "Valor/Status": ("valor_total",),
+}
 
-        if current_field:
-            fields[current_field].append(line)
 
-    for key in fields:
-        fields[key] = blank_if_dash_only(" ".join(fields[key]))
+def item_fields_for_headers(header_map):
+    """Conjunto de campos do item que as colunas de `header_map` realmente usam."""
+    wanted = set()
+    for header in header_map:
+        wanted.update(HEADER_FIELD_DEPENDENCIES.get(header, ()))
+    if "bem" in wanted and "Descrição" not in header_map and "Destinação" not in header_map:
+        # Sem colunas próprias, descrição e destinação entram no Material/Serviço.
+        wanted.update(("descricao", "destinacao"))
+    return frozenset(wanted)
 
-    return fields
+
+def extract_fields(item_lines, tags=None, wanted=None):
+    """Campos do item. Com `wanted`, só esses são acumulados e normalizados;
+    os demais voltam vazios (ver `item_fields_for_headers`)."""
+    fields = {
+        key: [] for key in ITEM_FIELD_NAMES[:-1] if wanted is None or key in wanted
+    }
+    keep_art_num = wanted is None or "art_num" in wanted
+    art_num = ""
+    current_field = None
+    if tags is None:
+        tags = classify_lines(item_lines)
+
+    for line, tag in zip(item_lines, tags):
+        kind = tag.kind
+        if kind == LINE_STOP:
+            current_field = None
+            continue
+
+        if kind == LINE_ACTION or kind == LINE_FIELD:
+            # Campo fora da projeção: a linha ainda encerra o campo anterior,
+            # mas nada é acumulado até o próximo rótulo.
+            current_field = fields.get(tag.key)
+            if tag.payload and current_field is not None:
+                current_field.append(tag.payload)
+            continue
+
+        if kind == LINE_ART:
+            current_field = fields.get("art")
+            if tag.payload and current_field is not None:
+                current_field.append(tag.payload)
+            if keep_art_num:
+                art_num = tag.key
+            continue
+
+        if current_field is not None:
+            current_field.append(line)
+
+    result = dict.fromkeys(ITEM_FIELD_NAMES, "")
+    for key, parts in fields.items():
+        if parts:
+            result[key] = blank_if_dash_only(" ".join(parts))
+    result["art_num"] = blank_if_dash_only(" ".join(art_num))
+    return result
 
 
 def _inject_reference_text(base_text: str, reference_text: str) -> str:
@@ -737,45 +1563,107 @@ def replace_placeholder_segment(base_text: str, token: str, value: str) -> str:
     return pattern.sub(value or "", text)
 
 
+class _StyleInterner:
+    """Ids de estilos derivados já registrados num workbook.
+
+    Cada combinação (fonte recolorida, formato numérico) é montada e
+    registrada nas coleções do workbook uma única vez; as demais células
+    recebem o id direto no seu StyleArray, sem criar objetos de estilo.
+    """
+
+    __slots__ = ("black_fonts", "number_formats")
+
+    def __init__(self):
+        self.black_fonts = {}
+        self.number_formats = {}
+
+    def black_font_id(self, wb, font_id: int) -> int:
+        black_id = self.black_fonts.get(font_id)
+        if black_id is None:
+            font = copy.copy(wb._fonts[font_id])
+            font.color = "FF000000"
+            black_id = self.black_fonts[font_id] = wb._fonts.add(font)
+        return black_id
+
+    def number_format_id(self, wb, number_format: str) -> int:
+        fmt_id = self.number_formats.get(number_format)
+        if fmt_id is None:
+            if number_format in BUILTIN_FORMATS_REVERSE:
+                fmt_id = BUILTIN_FORMATS_REVERSE[number_format]
+            else:
+                fmt_id = wb._number_formats.add(number_format) + BUILTIN_FORMATS_MAX_SIZE
+            self.number_formats[number_format] = fmt_id
+        return fmt_id
+
+
+_STYLE_INTERNERS = weakref.WeakKeyDictionary()
+
+
+def _style_interner(wb) -> _StyleInterner:
+    interner = _STYLE_INTERNERS.get(wb)
+    if interner is None:
+        interner = _STYLE_INTERNERS[wb] = _StyleInterner()
+    return interner
+
+
+def _cell_style_array(cell) -> StyleArray:
+    # Células criadas por `ws.cell()` sem estilo têm `_style` None; o openpyxl
+    # só materializa o StyleArray quando alguém lê `style_id`.
+    if cell._style is None:
+        cell._style = StyleArray()
+    return cell._style
+
+
+def _set_font_black(ws, cell):
+    style = _cell_style_array(cell)
+    style.fontId = _style_interner(ws.parent).black_font_id(ws.parent, style.fontId)
+
+
 def set_cell_font_black(ws, cell_ref: str):
-    cell = ws[cell_ref]
-    font = copy.copy(cell.font)
-    font.color = "FF000000"
-    cell.font = font
+    _set_font_black(ws, ws[cell_ref])
 
 
 def set_row_top_fonts_black(ws, row: int, start_col: int = 1, end_col: int = 12):
     for col in range(start_col, end_col + 1):
-        set_cell_font_black(ws, f"{openpyxl.utils.get_column_letter(col)}{row}")
+        _set_font_black(ws, ws.cell(row, col))
+
 
+def iter_analysis_blank_cells(analysis_data, block_height: int = ANALYSIS_BLOCK_HEIGHT):
+    """Gera (meta, coluna, linha) das células de análise sem valor.
 
-def collect_analysis_missing_cells(analysis_data):
-    missing_cells = set()
+    `block_height` é a altura real dos blocos de Meta Específica no modelo
+    (ver `template_descriptor`); A8 e F10 saem com meta "".
+    """
     if not blank_if_dash_only(analysis_data.get("zero_indicador_geral", "")):
-        missing_cells.add("F10")
+        yield "", "F", 10
     if not blank_if_dash_only(analysis_data.get("one_meta_geral", "")):
-        missing_cells.add("A8")
+        yield "", "A", 8
 
     sections = analysis_data.get("sections") or []
     reference = blank_if_dash_only(analysis_data.get("three_valor_referencia", ""))
     for idx, section in enumerate(sections, start=1):
-        start_row = ANALYSIS_BLOCK_START_ROW + (idx - 1) * ANALYSIS_BLOCK_HEIGHT
+        start_row = ANALYSIS_BLOCK_START_ROW + (idx - 1) * block_height
+        meta = section.get("numero_meta", "")
         if not blank_if_dash_only(section.get("meta_texto", "")):
-            missing_cells.add(f"A{start_row}")
+            yield meta, "A", start_row
         section_fonte = blank_if_dash_only(section.get("fonte_ano", ""))
         if not section_fonte and not reference:
-            missing_cells.add(f"E{start_row}")
+            yield meta, "E", start_row
         if not blank_if_dash_only(section.get("descricao_indicador", "")) or not blank_if_dash_only(
             section.get("formula", "")
         ):
-            missing_cells.add(f"F{start_row}")
+            yield meta, "F", start_row
         if not blank_if_dash_only(section.get("meta_pesp", "")):
-            missing_cells.add(f"G{start_row}")
+            yield meta, "G", start_row
         if not blank_if_dash_only(section.get("meta_pnsp", "")):
-            missing_cells.add(f"H{start_row}")
+            yield meta, "H", start_row
         if not blank_if_dash_only(section.get("carteira_mjsp", "")):
-            missing_cells.add(f"I{start_row}")
-    return sorted(missing_cells)
+            yield meta, "I", start_row
+
+
+def collect_analysis_missing_cells(analysis_data, block_height: int = ANALYSIS_BLOCK_HEIGHT):
+    blank_cells = iter_analysis_blank_cells(analysis_data, block_height)
+    return sorted({f"{column}{row}" for _, column, row in blank_cells})
 
 
 def build_material(bem, descricao, destinacao):
@@ -840,56 +1728,67 @@ def _infer_analysis_block_height(ws) -> int:
     return ANALYSIS_BLOCK_HEIGHT
 
 
-def _copy_analysis_block(ws, src_start_row: int, dst_start_row: int, block_height: int):
-    for row_offset in range(block_height):
-        src_row = src_start_row + row_offset
-        dst_row = dst_start_row + row_offset
-        ws.row_dimensions[dst_row].height = ws.row_dimensions[src_row].height
+# Atributos de estilo copiados entre blocos (os mesmos que a cópia campo a
+# campo por font/fill/border/alignment/number_format/protection alterava).
+_BLOCK_STYLE_IDS = ("fontId", "fillId", "borderId", "alignmentId", "numFmtId", "protectionId")
+
+
+def _replicate_analysis_block(ws, src_start_row: int, dst_start_rows, block_height: int):
+    """Copia o bloco-modelo para cada início em `dst_start_rows`.
+
+    O bloco de origem é lido uma vez; as células de destino recebem os
+    mesmos ids de estilo (já compartilhados no workbook), sem recriar
+    objetos de fonte/borda por célula. As mesclagens antigas dos destinos
+    saem numa única varredura e o padrão de mesclagem do modelo é reaplicado
+    em cada destino.
+    """
+    dst_start_rows = list(dst_start_rows)
+    if not dst_start_rows or block_height <= 0:
+        return
+    src_end_row = src_start_row + block_height - 1
+    template_rows = []
+    for src_row in range(src_start_row, src_end_row + 1):
+        cells = []
         for col in range(ANALYSIS_BLOCK_START_COL, ANALYSIS_BLOCK_END_COL + 1):
             src_cell = ws.cell(src_row, col)
-            dst_cell = ws.cell(dst_row, col)
-            dst_cell.value = src_cell.value
-            dst_cell.font = copy.copy(src_cell.font)
-            dst_cell.fill = copy.copy(src_cell.fill)
-            dst_cell.border = copy.copy(src_cell.border)
-            dst_cell.alignment = copy.copy(src_cell.alignment)
-            dst_cell.number_format = src_cell.number_format
-            dst_cell.protection = copy.copy(src_cell.protection)
-
-    shift = dst_start_row - src_start_row
-    template_merges = [
-            rng
-            for rng in list(ws.merged_cells.ranges)
-            if (
-                rng.min_row >= src_start_row
-                and rng.max_row < src_start_row + block_height
-                and rng.min_col >= ANALYSIS_BLOCK_START_COL
-                and rng.max_col <= ANALYSIS_BLOCK_END_COL
+            style = _cell_style_array(src_cell)
+            cells.append(
+                (col, src_cell.value, [getattr(style, attr) for attr in _BLOCK_STYLE_IDS])
             )
-    ]
-    for rng in template_merges:
-        ws.merge_cells(
-            start_row=rng.min_row + shift,
-            start_column=rng.min_col,
-            end_row=rng.max_row + shift,
-            end_column=rng.max_col,
-        )
-
+        template_rows.append((ws.row_dimensions[src_row].height, cells))
 
-def _unmerge_analysis_block_region(ws, block_start_row: int, block_height: int):
-    block_end_row = block_start_row + block_height - 1
-    to_unmerge = [
-        str(rng)
-        for rng in list(ws.merged_cells.ranges)
-        if (
-            rng.min_row >= block_start_row
-            and rng.max_row <= block_end_row
-            and rng.min_col >= ANALYSIS_BLOCK_START_COL
-            and rng.max_col <= ANALYSIS_BLOCK_END_COL
-        )
-    ]
-    for rng in to_unmerge:
-        ws.unmerge_cells(rng)
+    template_merges = []
+    dst_starts = set(dst_start_rows)
+    first_dst = min(dst_starts)
+    for rng in list(ws.merged_cells.ranges):
+        if rng.min_col < ANALYSIS_BLOCK_START_COL or rng.max_col > ANALYSIS_BLOCK_END_COL:
+            continue
+        if rng.min_row >= src_start_row and rng.max_row <= src_end_row:
+            template_merges.append((rng.min_row, rng.min_col, rng.max_row, rng.max_col))
+        # Mesclagem contida num único bloco de destino: sai antes da cópia.
+        if rng.min_row >= first_dst:
+            block_start = rng.min_row - (rng.min_row - src_start_row) % block_height
+            if block_start in dst_starts and rng.max_row < block_start + block_height:
+                ws.unmerge_cells(str(rng))
+
+    for dst_start_row in dst_start_rows:
+        for row_offset, (height, cells) in enumerate(template_rows):
+            dst_row = dst_start_row + row_offset
+            ws.row_dimensions[dst_row].height = height
+            for col, value, style_ids in cells:
+                dst_cell = ws.cell(dst_row, col)
+                dst_cell.value = value
+                dst_style = _cell_style_array(dst_cell)
+                for attr, style_id in zip(_BLOCK_STYLE_IDS, style_ids):
+                    setattr(dst_style, attr, style_id)
+        shift = dst_start_row - src_start_row
+        for min_row, min_col, max_row, max_col in template_merges:
+            ws.merge_cells(
+                start_row=min_row + shift,
+                start_column=min_col,
+                end_row=max_row + shift,
+                end_column=max_col,
+            )
 
 
 def _shift_row_dimensions_on_insert(ws, insert_at: int, amount: int):
@@ -910,56 +1809,57 @@ def _shift_row_dimensions_on_insert(ws, insert_at: int, amount: int):
         del ws.row_dimensions[row_idx]
 
 
-def _ranges_overlap(a, b) -> bool:
-    return not (
-        a[2] < b[0]
-        or b[2] < a[0]
-        or a[3] < b[1]
-        or b[3] < a[1]
-    )
+class _MergeIndex:
+    """Intervalos de linhas ocupados por mesclagens, por coluna.
+
+    Mesclagens aceitas não se sobrepõem, então em cada coluna os intervalos
+    são disjuntos e ordenados: basta um bisect para achar o único candidato
+    a colidir com uma nova faixa.
+    """
+
+    def __init__(self):
+        self._by_col = defaultdict(list)
+
+    def overlaps(self, min_row, min_col, max_row, max_col) -> bool:
+        for col in range(min_col, max_col + 1):
+            intervals = self._by_col.get(col)
+            if not intervals:
+                continue
+            pos = bisect.bisect_right(intervals, (max_row, math.inf))
+            if pos and intervals[pos - 1][1] >= min_row:
+                return True
+        return False
+
+    def add(self, min_row, min_col, max_row, max_col):
+        for col in range(min_col, max_col + 1):
+            bisect.insort(self._by_col[col], (min_row, max_row))
 
 
 def _insert_rows_preserving_merges(ws, insert_at: int, amount: int):
     if amount <= 0:
         return
-    original_ranges = [
-        (rng.min_row, rng.min_col, rng.max_row, rng.max_col)
-        for rng in list(ws.merged_cells.ranges)
-    ]
-    for rng in list(ws.merged_cells.ranges):
+    index = _MergeIndex()
+    moved = []
+    for rng in sorted(ws.merged_cells.ranges, key=lambda rng: (rng.min_row, rng.min_col)):
+        bounds = (rng.min_row, rng.min_col, rng.max_row, rng.max_col)
+        if rng.max_row < insert_at and bounds[:2] != bounds[2:]:
+            # Acima da inserção: nada se move, a mesclagem fica como está.
+            index.add(*bounds)
+            continue
         ws.unmerge_cells(str(rng))
+        if rng.max_row >= insert_at:
+            moved.append(bounds)
     ws.insert_rows(insert_at, amount)
     _shift_row_dimensions_on_insert(ws, insert_at, amount)
-    rebuilt = []
 
     def add_range(min_row, min_col, max_row, max_col):
         if min_row > max_row or min_col > max_col:
             return
         if min_row == max_row and min_col == max_col:
             return
-        candidate = (min_row, min_col, max_row, max_col)
-        for existing in rebuilt:
-            if _ranges_overlap(candidate, existing):
-                return
-        rebuilt.append(candidate)
-
-    for min_row, min_col, max_row, max_col in original_ranges:
-        if max_row < insert_at:
-            add_range(min_row, min_col, max_row, max_col)
-            continue
-        if min_row >= insert_at:
-            add_range(
-                min_row + amount,
-                min_col,
-                max_row + amount,
-                max_col,
-            )
-            continue
-        # Split merges that cross the insertion point to avoid invalid overlaps.
-        add_range(min_row, min_col, insert_at - 1, max_col)
-        add_range(insert_at + amount, min_col, max_row + amount, max_col)
-
-    for min_row, min_col, max_row, max_col in rebuilt:
+        if index.overlaps(min_row, min_col, max_row, max_col):
+            return
+        index.add(min_row, min_col, max_row, max_col)
         ws.merge_cells(
             start_row=min_row,
             start_column=min_col,
@@ -967,13 +1867,29 @@ def _insert_rows_preserving_merges(ws, insert_at: int, amount: int):
             end_column=max_col,
         )
 
+    for min_row, min_col, max_row, max_col in moved:
+        if min_row >= insert_at:
+            add_range(min_row + amount, min_col, max_row + amount, max_col)
+            continue
+        # Split merges that cross the insertion point to avoid invalid overlaps.
+        add_range(min_row, min_col, insert_at - 1, max_col)
+        add_range(insert_at + amount, min_col, max_row + amount, max_col)
 
-def _ensure_analysis_blocks(ws, required_blocks: int):
-    block_height = _infer_analysis_block_height(ws)
-    existing_blocks = _count_analysis_blocks(ws)
+
+def _ensure_analysis_blocks(ws, required_blocks: int, layout=None):
+    # `layout` (descritor do template ainda intacto) evita varrer a planilha.
+    if layout is not None:
+        block_height = layout["block_height"]
+        existing_blocks = layout["block_count"]
+    else:
+        block_height = _infer_analysis_block_height(ws)
+        existing_blocks = _count_analysis_blocks(ws)
     if required_blocks <= existing_blocks:
         return
-    items_title_row = _find_items_title_row(ws)
+    if layout is not None:
+        items_title_row = layout["items_title_row"]
+    else:
+        items_title_row = _find_items_title_row(ws)
 
     extra_blocks = required_blocks - existing_blocks
     additional_rows_needed = extra_blocks * block_height
@@ -991,10 +1907,8 @@ def _ensure_analysis_blocks(ws, required_blocks: int):
         reusable_gap_rows = max(0, (items_title_row - insert_at) - minimum_gap_rows)
     rows_to_insert = max(0, additional_rows_needed - reusable_gap_rows)
     _insert_rows_preserving_merges(ws, insert_at, rows_to_insert)
-    for block_idx in range(existing_blocks + 1, required_blocks + 1):
-        dst_start_row = ANALYSIS_BLOCK_START_ROW + (block_idx - 1) * block_height
-        _unmerge_analysis_block_region(ws, dst_start_row, block_height)
-        _copy_analysis_block(ws, ANALYSIS_BLOCK_START_ROW, dst_start_row, block_height)
+    # O conteúdo dos blocos novos é copiado por fill_analysis_template, junto
+    # com os demais blocos a partir do segundo.
 
 
 def _apply_token_or_keep_default(base_text: str, token: str, value: str) -> str:
@@ -1011,8 +1925,9 @@ def _apply_token_or_keep_default(base_text: str, token: str, value: str) -> str:
     return replace_placeholder_segment(base_text, token, value)
 
 
-def fill_analysis_template(ws, lines):
-    analysis_data = extract_analysis_data(lines)
+def fill_analysis_template(ws, lines, analysis_data=None, layout=None):
+    if analysis_data is None:
+        analysis_data = extract_analysis_data(lines)
     indicador_geral = analysis_data["zero_indicador_geral"]
     meta_geral = analysis_data["one_meta_geral"]
     sections = analysis_data["sections"]
@@ -1037,13 +1952,21 @@ def fill_analysis_template(ws, lines):
     if not sections:
         return
 
-    block_height = _infer_analysis_block_height(ws)
-    _ensure_analysis_blocks(ws, len(sections))
+    if layout is not None:
+        block_height = layout["block_height"]
+    else:
+        block_height = _infer_analysis_block_height(ws)
+    _ensure_analysis_blocks(ws, len(sections), layout)
 
-    for idx in range(2, len(sections) + 1):
-        start_row = ANALYSIS_BLOCK_START_ROW + (idx - 1) * block_height
-        _unmerge_analysis_block_region(ws, start_row, block_height)
-        _copy_analysis_block(ws, ANALYSIS_BLOCK_START_ROW, start_row, block_height)
+    _replicate_analysis_block(
+        ws,
+        ANALYSIS_BLOCK_START_ROW,
+        [
+            ANALYSIS_BLOCK_START_ROW + (idx - 1) * block_height
+            for idx in range(2, len(sections) + 1)
+        ],
+        block_height,
+    )
 
     for idx, section in enumerate(sections, start=1):
         start_row = ANALYSIS_BLOCK_START_ROW + (idx - 1) * block_height
@@ -1114,48 +2037,73 @@ def fill_analysis_template(ws, lines):
         ws[cell_i] = i_replaced
         set_row_top_fonts_black(ws, start_row, 1, 12)
 
+def _clear_cell_values(ws, min_row: int, max_col: int):
+    """Apaga os valores a partir de `min_row` (até a coluna `max_col`).
+
+    Só percorre as células que existem no armazenamento da planilha: a cauda
+    formatada do modelo não é materializada célula a célula.
+    """
+    for (row, col), cell in ws._cells.items():
+        if row >= min_row and col <= max_col and not isinstance(cell, MergedCell):
+            cell.value = None
+
+
+def _has_default_style(ws, row: int, columns, default_style) -> bool:
+    """Equivale a `style_id == 0` em todas as colunas, sem criar células."""
+    if default_style is None:
+        return True
+    blank_style = StyleArray()
+    for col_idx in columns:
+        cell = ws._cells.get((row, col_idx))
+        style = cell._style if cell is not None and cell._style is not None else blank_style
+        if style != default_style:
+            return False
+    return True
+
+
 def fill_worksheet(ws, rows, header_map, start_row=3):
     # Clear previous data (keep headers)
     max_col = max(header_map.values()) if header_map else ws.max_column
-    for row in ws.iter_rows(min_row=start_row, max_row=ws.max_row, max_col=max_col):
-        for cell in row:
-            if isinstance(cell, MergedCell):
-                continue
-            cell.value = None
+    _clear_cell_values(ws, start_row, max_col)
 
+    cell_styles = ws.parent._cell_styles
+    default_style = cell_styles[0] if len(cell_styles) else None
+    columns = tuple(header_map.values())
     style_template_row = start_row if start_row <= ws.max_row else None
-    style_template_has_custom_style = False
-    if style_template_row is not None and header_map:
-        style_template_has_custom_style = any(
-            ws.cell(style_template_row, col_idx).style_id != 0
-            for col_idx in header_map.values()
-        )
+    template_cells = []
+    if style_template_row is not None and columns and not _has_default_style(
+        ws, style_template_row, columns, default_style
+    ):
+        template_cells = [(col_idx, ws.cell(style_template_row, col_idx)) for col_idx in columns]
+        template_height = ws.row_dimensions[style_template_row].height
+    currency_format_id = None
 
     for idx, row_data in enumerate(rows, start=start_row):
         if (
-            style_template_row is not None
-            and style_template_has_custom_style
-            and header_map
+            template_cells
             and idx != style_template_row
-            and all(ws.cell(idx, col_idx).style_id == 0 for col_idx in header_map.values())
+            and _has_default_style(ws, idx, columns, default_style)
         ):
-            for col_idx in header_map.values():
-                ws.cell(idx, col_idx)._style = copy.copy(
-                    ws.cell(style_template_row, col_idx)._style
-                )
-            template_height = ws.row_dimensions[style_template_row].height
+            # Carimba o estilo da linha modelo de uma vez (ids, sem objetos).
+            for col_idx, template_cell in template_cells:
+                ws.cell(idx, col_idx)._style = StyleArray(_cell_style_array(template_cell))
             if template_height is not None:
                 ws.row_dimensions[idx].height = template_height
         for header, col_idx in header_map.items():
             cell = ws.cell(row=idx, column=col_idx)
             if isinstance(cell, MergedCell):
                 continue
-            cell.value = row_data.get(header, "")
+            value = row_data.get(header, "")
+            cell.value = value
+            if isinstance(value, Decimal):
+                if currency_format_id is None:
+                    currency_format_id = _style_interner(ws.parent).number_format_id(
+                        ws.parent, CURRENCY_NUMBER_FORMAT
+                    )
+                _cell_style_array(cell).numFmtId = currency_format_id
 
 
-def get_template_header_info(template_path: Path):
-    wb = openpyxl.load_workbook(template_path)
-    ws = wb.active
+def _items_template_header_info(ws):
     headers, header_map = get_header_info_from_ws(ws, 2)
     if not header_map:
         headers = OUTPUT_HEADERS[:]
@@ -1167,6 +2115,11 @@ def get_template_header_info(template_path: Path):
     return headers, header_map
 
 
+def get_template_header_info(template_path: Path):
+    descriptor = template_descriptor(template_path)
+    return list(descriptor["headers"]), dict(descriptor["header_map"])
+
+
 def find_items_table_header_row(ws):
     for row in range(1, ws.max_row + 1):
         value = normalize(str(ws.cell(row=row, column=1).value or "")).upper()
@@ -1176,33 +2129,125 @@ def find_items_table_header_row(ws):
 
 
 def get_analysis_items_header_info(template_path: Path):
-    wb = openpyxl.load_workbook(template_path)
-    ws = wb.active
-    header_row = find_items_table_header_row(ws)
-    if not header_row:
-        return None, [], {}
-    headers, header_map = get_header_info_from_ws(ws, header_row)
-    return header_row, headers, header_map
+    descriptor = template_descriptor(template_path)
+    return (
+        descriptor["items_header_row"],
+        list(descriptor["items_headers"]),
+        dict(descriptor["items_header_map"]),
+    )
 
 
-def update_action_header(
-    ws,
-    rows,
-    header_map,
-    art_num_preferred=None,
-    action_header_title_preferred=None,
-    header_row=2,
-):
-    col_idx = header_map.get(ACTION_HEADER_KEY)
-    if not col_idx or not rows:
+def describe_template_ws(ws):
+    """Descritor do template: modo, cabeçalhos e geometria dos blocos de análise.
+
+    Reúne o que `get_template_header_info`, `get_analysis_items_header_info`
+    e `fill_analysis_template` derivariam varrendo linhas e mesclagens.
+    """
+    analysis = is_analysis_template_sheet(ws)
+    headers, header_map = _items_template_header_info(ws)
+    items_header_row = find_items_table_header_row(ws)
+    items_headers, items_header_map = [], {}
+    if items_header_row:
+        items_headers, items_header_map = get_header_info_from_ws(ws, items_header_row)
+    descriptor = {
+        "version": TEMPLATE_DESCRIPTOR_VERSION,
+        "analysis": analysis,
+        "headers": headers,
+        "header_map": header_map,
+        "items_header_row": items_header_row,
+        "items_headers": items_headers,
+        "items_header_map": items_header_map,
+        "items_title_row": None,
+        "block_height": None,
+        "block_count": None,
+        "merged_ranges": [
+            [merged.min_row, merged.min_col, merged.max_row, merged.max_col]
+            for merged in ws.merged_cells.ranges
+        ],
+    }
+    if analysis:
+        descriptor["items_title_row"] = _find_items_title_row(ws)
+        descriptor["block_height"] = _infer_analysis_block_height(ws)
+        descriptor["block_count"] = _count_analysis_blocks(ws)
+    return descriptor
+
+
+def _template_descriptor_path(digest: str, cache_dir=None) -> Path:
+    name = f"{digest}-v{TEMPLATE_DESCRIPTOR_VERSION}.json"
+    return Path(cache_dir or TEMPLATE_CACHE_DIR) / name
+
+
+def load_template_descriptor(digest: str, cache_dir=None):
+    """Descritor gravado para o hash do template, ou None."""
+    try:
+        descriptor = json.loads(_template_descriptor_path(digest, cache_dir).read_text("utf-8"))
+    except (OSError, ValueError):
+        return None
+    if descriptor.get("version") != TEMPLATE_DESCRIPTOR_VERSION:
+        return None
+    return descriptor
+
+
+def store_template_descriptor(digest: str, descriptor, cache_dir=None):
+    path = _template_descriptor_path(digest, cache_dir)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _unique_tmp_path(path)
+        tmp_path.write_text(json.dumps(descriptor, ensure_ascii=False), "utf-8")
+        os.replace(tmp_path, path)
+    except OSError:
         return
+
+
+_TEMPLATE_DESCRIPTORS = {}
+_TEMPLATE_DIGESTS = {}
+
+
+def template_digest(template_path) -> str:
+    """SHA-256 do arquivo do template, calculado uma vez por versão do arquivo."""
+    key = _template_cache_key(template_path)
+    digest = _template_cache_get(_TEMPLATE_DIGESTS, key)
+    if digest is None:
+        digest = hashlib.sha256(Path(template_path).read_bytes()).hexdigest()
+        _template_cache_put(_TEMPLATE_DIGESTS, key, digest)
+    return digest
+
+
+def warm_template(template_path) -> str:
+    """Deixa descritor e (no modo análise) snapshot do template no cache do
+    processo; devolve `template_digest`."""
+    if template_descriptor(template_path)["analysis"]:
+        _template_snapshot(template_path)
+    return template_digest(template_path)
+
+
+def template_descriptor(template_path, cache_dir=None):
+    """Descritor do template (ver `describe_template_ws`), somente leitura.
+
+    Em memória, por (caminho, mtime, tamanho); em disco, num arquivo ao lado
+    do cache de linhas, pelo SHA-256 do template. Só quando nenhum dos dois
+    existe o workbook é aberto.
+    """
+    path = Path(template_path)
+    key = _template_cache_key(path)
+    descriptor = _template_cache_get(_TEMPLATE_DESCRIPTORS, key)
+    if descriptor is not None:
+        return descriptor
+    digest = template_digest(path)
+    descriptor = load_template_descriptor(digest, cache_dir)
+    if descriptor is None:
+        descriptor = describe_template_ws(_template_worksheet(path))
+        store_template_descriptor(digest, descriptor, cache_dir)
+    _template_cache_put(_TEMPLATE_DESCRIPTORS, key, descriptor)
+    return descriptor
+
+
+def action_header_title(rows, art_num_preferred=None, action_header_title_preferred=None):
+    """Título da coluna "Ação conforme Art." ou None para manter o do template."""
+    if not rows:
+        return None
     if action_header_title_preferred:
-        ws.cell(
-            row=header_row,
-            column=col_idx,
-            value=action_header_title_preferred,
-        )
-        return
+        return action_header_title_preferred
     art_num = art_num_preferred
     if not art_num:
         counts = {}
@@ -1225,30 +2270,533 @@ def update_action_header(
                 best_pos = pos
         art_num = best_art
     if not art_num:
-        return
+        return None
     if str(art_num) not in {"6", "7", "8"}:
+        return None
+    return f"Ação conforme Art. {art_num}º da portaria nº 685"
+
+
+def update_action_header(
+    ws,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+    header_row=2,
+):
+    col_idx = header_map.get(ACTION_HEADER_KEY)
+    if not col_idx:
         return
-    ws.cell(
-        row=header_row,
-        column=col_idx,
-        value=f"Ação conforme Art. {art_num}º da portaria nº 685",
+    title = action_header_title(rows, art_num_preferred, action_header_title_preferred)
+    if title:
+        ws.cell(row=header_row, column=col_idx, value=title)
+
+
+# --- Escrita direta do XML da planilha (modo itens) -------------------------
+#
+# O template de itens só muda na planilha ativa (linhas de dados e o título
+# da coluna de ação) e, no modo `numeric_values`, em styles.xml. As demais
+# entradas do .xlsx são copiadas como estão e o XML da planilha é gerado
+# linha a linha, sem montar o modelo de objetos do openpyxl. Qualquer
+# estrutura que esse caminho não trate (mesclagens ou fórmulas na área de
+# dados, planilha sem <sheetData>...) devolve None e o chamador usa o
+# caminho openpyxl.
+
+ITEMS_DATA_START_ROW = 3
+ITEMS_HEADER_ROW = 2
+
+_XML_ATTR_RE = re.compile(r"""([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_SHEET_ROW_RE = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.DOTALL)
+_SHEET_CELL_RE = re.compile(r"<c\b[^>]*?(?:/>|>.*?</c>)", re.DOTALL)
+_CELL_REF_RE = re.compile(r"([A-Z]+)(\d+)$")
+_MERGE_REF_RE = re.compile(r"""<mergeCell\b[^>]*\bref\s*=\s*["']([^"']+)["']""")
+_XML_ILLEGAL_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_ODOC_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _xml_attrs(text: str) -> dict:
+    # Valores entre aspas simples são regravados entre aspas duplas.
+    return {
+        name: double if single is None else single.replace('"', "&quot;")
+        for name, double, single in (
+            match.group(1, 2, 3) for match in _XML_ATTR_RE.finditer(text)
+        )
+    }
+
+
+def _xml_attr_text(attrs: dict) -> str:
+    return "".join(f' {name}="{value}"' for name, value in attrs.items())
+
+
+def _xml_escape(text: str) -> str:
+    text = _XML_ILLEGAL_CHARS_RE.sub("", text)
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _xml_unescape(text: str) -> str:
+    return (
+        text.replace("&quot;", '"')
+        .replace("&apos;", "'")
+        .replace("&lt;", "<")
+        .replace("&gt;", ">")
+        .replace("&amp;", "&")
     )
 
 
-def write_excel(
+def _active_sheet_entry(archive) -> str:
+    workbook_xml = archive.read("xl/workbook.xml").decode("utf-8")
+    view = re.search(r"<workbookView\b[^>]*>", workbook_xml)
+    active_tab = int(_xml_attrs(view.group(0)).get("activeTab", 0)) if view else 0
+    sheets = re.findall(r"<sheet\b[^>]*>", workbook_xml)
+    rel_id = _xml_attrs(sheets[active_tab]).get("r:id")
+    rels_xml = archive.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+    for rel in re.findall(r"<Relationship\b[^>]*>", rels_xml):
+        attrs = _xml_attrs(rel)
+        if attrs.get("Id") == rel_id:
+            target = attrs["Target"]
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise KeyError(rel_id)
+
+
+class _CellXml:
+    """Célula do XML da planilha: atributos + conteúdo interno (valor)."""
+
+    __slots__ = ("attrs", "inner")
+
+    def __init__(self, attrs, inner=""):
+        self.attrs = attrs
+        self.inner = inner
+
+    @property
+    def style(self) -> int:
+        return int(self.attrs.get("s", 0))
+
+    def clear(self):
+        self.attrs.pop("t", None)
+        self.inner = ""
+
+    def set_value(self, value, style_book=None):
+        self.attrs.pop("t", None)
+        if value is None or value == "":
+            self.inner = ""
+        elif isinstance(value, Decimal):
+            if style_book is not None:
+                self.attrs["s"] = str(
+                    style_book.with_number_format(self.style, CURRENCY_NUMBER_FORMAT)
+                )
+            self.inner = f"<v>{value}</v>"
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.inner = f"<v>{value}</v>"
+        else:
+            text = _xml_escape(str(value))
+            space = ' xml:space="preserve"' if text != text.strip() else ""
+            self.attrs["t"] = "inlineStr"
+            self.inner = f"<is><t{space}>{text}</t></is>"
+
+    def xml(self) -> str:
+        if self.inner:
+            return f"<c{_xml_attr_text(self.attrs)}>{self.inner}</c>"
+        return f"<c{_xml_attr_text(self.attrs)}/>"
+
+
+def _parse_sheet_row(row_xml: str):
+    open_end = row_xml.index(">")
+    self_closing = row_xml[open_end - 1] == "/"
+    attrs = _xml_attrs(row_xml[: open_end - 1 if self_closing else open_end])
+    attrs.pop("spans", None)
+    cells = {}
+    if not self_closing:
+        for cell_xml in _SHEET_CELL_RE.findall(row_xml, open_end):
+            cell_open_end = cell_xml.index(">")
+            cell_self_closing = cell_xml[cell_open_end - 1] == "/"
+            cell_attrs = _xml_attrs(
+                cell_xml[: cell_open_end - 1 if cell_self_closing else cell_open_end]
+            )
+            ref = _CELL_REF_RE.match(cell_attrs.get("r", ""))
+            if not ref:
+                return None
+            inner = "" if cell_self_closing else cell_xml[cell_open_end + 1 : -len("</c>")]
+            cells[column_index_from_string(ref.group(1))] = _CellXml(cell_attrs, inner)
+    return attrs, cells
+
+
+def _row_xml(row_idx: int, attrs: dict, cells: dict) -> str:
+    attrs["r"] = str(row_idx)
+    for col in sorted(cells):
+        cells[col].attrs["r"] = f"{get_column_letter(col)}{row_idx}"
+    body = "".join(
+        cells[col].xml()
+        for col in sorted(cells)
+        if cells[col].inner or "s" in cells[col].attrs
+    )
+    return f"<row{_xml_attr_text(attrs)}>{body}</row>" if body else f"<row{_xml_attr_text(attrs)}/>"
+
+
+class _StyleBook:
+    """styles.xml com estilos derivados criados sob demanda (formato R$)."""
+
+    def __init__(self, styles_xml: str):
+        self.styles_xml = styles_xml
+        self.changed = False
+        self._derived = {}
+        self._new_xfs = []
+        self._new_num_fmts = []
+        section = re.search(r"<cellXfs\b[^>]*>(.*?)</cellXfs>", styles_xml, re.DOTALL)
+        self._xfs = (
+            re.findall(r"<xf\b[^>]*?(?:/>|>.*?</xf>)", section.group(1), re.DOTALL)
+            if section
+            else []
+        )
+        self._num_fmts = {
+            _xml_unescape(attrs["formatCode"]): int(attrs["numFmtId"])
+            for attrs in map(_xml_attrs, re.findall(r"<numFmt\b[^>]*>", styles_xml))
+        }
+
+    def _num_fmt_id(self, format_code: str) -> int:
+        if format_code not in self._num_fmts:
+            fmt_id = max([163, *self._num_fmts.values()]) + 1
+            self._num_fmts[format_code] = fmt_id
+            code = _xml_escape(format_code).replace('"', "&quot;")
+            self._new_num_fmts.append(f'<numFmt numFmtId="{fmt_id}" formatCode="{code}"/>')
+        return self._num_fmts[format_code]
+
+    def with_number_format(self, style_id: int, format_code: str) -> int:
+        key = (style_id, format_code)
+        if key not in self._derived:
+            fmt_id = self._num_fmt_id(format_code)
+            base = self._xfs[style_id] if style_id < len(self._xfs) else "<xf/>"
+            open_end = base.index(">")
+            self_closing = base[open_end - 1] == "/"
+            attrs = _xml_attrs(base[: open_end - 1 if self_closing else open_end])
+            attrs.setdefault("fontId", "0")
+            attrs.setdefault("fillId", "0")
+            attrs.setdefault("borderId", "0")
+            attrs["numFmtId"] = str(fmt_id)
+            attrs["applyNumberFormat"] = "1"
+            rest = "/>" if self_closing else base[open_end:]
+            self._new_xfs.append(f"<xf{_xml_attr_text(attrs)}{rest}")
+            derived_id = len(self._xfs) + len(self._new_xfs) - 1
+            self._derived[key] = derived_id
+            # Estilo derivado já tem o formato: reaplicá-lo não cria outro xf.
+            self._derived[(derived_id, format_code)] = derived_id
+            self.changed = True
+        return self._derived[key]
+
+    def xml(self) -> str:
+        styles_xml = self.styles_xml
+        if self._new_num_fmts:
+            fmts = "".join(self._new_num_fmts)
+            count = len(self._num_fmts)
+            if re.search(r"<numFmts\b[^>]*/>", styles_xml):
+                styles_xml = re.sub(
+                    r"<numFmts\b[^>]*/>", f'<numFmts count="{count}">{fmts}</numFmts>', styles_xml, 1
+                )
+            elif "<numFmts" in styles_xml:
+                styles_xml = re.sub(r'(<numFmts\b[^>]*count=")\d+', rf"\g<1>{count}", styles_xml, 1)
+                styles_xml = styles_xml.replace("</numFmts>", f"{fmts}</numFmts>", 1)
+            else:
+                styles_xml = re.sub(
+                    r"(<styleSheet\b[^>]*>)",
+                    lambda match: f'{match.group(1)}<numFmts count="{count}">{fmts}</numFmts>',
+                    styles_xml,
+                    1,
+                )
+        if self._new_xfs:
+            count = len(self._xfs) + len(self._new_xfs)
+            styles_xml = re.sub(r'(<cellXfs\b[^>]*count=")\d+', rf"\g<1>{count}", styles_xml, 1)
+            styles_xml = styles_xml.replace("</cellXfs>", "".join(self._new_xfs) + "</cellXfs>", 1)
+        return styles_xml
+
+
+def _reset_sheet_view(head: str) -> str:
+    """Equivale a topLeftCell/seleção em A1 e zoom 100 do caminho openpyxl."""
+    match = re.search(r"<sheetView\b[^>]*?(/?)>", head)
+    if not match:
+        return head
+    self_closing = bool(match.group(1))
+    attrs = _xml_attrs(match.group(0))
+    attrs["topLeftCell"] = "A1"
+    attrs["zoomScale"] = "100"
+    opening = f"<sheetView{_xml_attr_text(attrs)}>"
+    selection = '<selection activeCell="A1" sqref="A1"/>'
+    if self_closing:
+        return f"{head[:match.start()]}{opening}{selection}</sheetView>{head[match.end():]}"
+    end = head.index("</sheetView>", match.end())
+    inner = head[match.end():end]
+    first_selection = re.search(r"<selection\b[^>]*/>", inner)
+    if first_selection:
+        selection_attrs = _xml_attrs(first_selection.group(0))
+        selection_attrs["activeCell"] = "A1"
+        selection_attrs["sqref"] = "A1"
+        inner = (
+            inner[: first_selection.start()]
+            + f"<selection{_xml_attr_text(selection_attrs)}/>"
+            + inner[first_selection.end():]
+        )
+    else:
+        pane = re.search(r"<pane\b[^>]*/>", inner)
+        at = pane.end() if pane else 0
+        inner = inner[:at] + selection + inner[at:]
+    return f"{head[:match.start()]}{opening}{inner}{head[end:]}"
+
+
+def _iter_items_sheet_xml(head, template_rows, tail, rows, header_map, title, style_book):
+    max_col = max(header_map.values())
+    header_cols = sorted(set(header_map.values()))
+    start_row = ITEMS_DATA_START_ROW
+    style_attrs, style_cells = template_rows.get(start_row, ({}, {}))
+    # Estilos da linha modelo como estão no template; depois que a própria
+    # linha recebe os dados (ex.: formato R$), as seguintes copiam o estilo já
+    # atualizado, como no caminho openpyxl.
+    template_styles = {
+        col: style_cells[col].attrs.get("s") for col in header_cols if col in style_cells
+    }
+    style_template_has_custom_style = any(
+        int(style or 0) != 0 for style in template_styles.values()
+    )
+    style_template_height = style_attrs.get("ht")
+    last_data_row = start_row + len(rows) - 1
+    max_row = max([last_data_row, *template_rows]) if template_rows else last_data_row
+
+    yield head
+    yield "<sheetData>"
+    batch = []
+    for row_idx in range(1, max_row + 1):
+        parsed = template_rows.get(row_idx)
+        if row_idx < start_row:
+            if parsed is None:
+                continue
+            attrs, cells = parsed
+            if row_idx == ITEMS_HEADER_ROW and title:
+                col = header_map[ACTION_HEADER_KEY]
+                cell = cells.setdefault(col, _CellXml({}))
+                cell.set_value(title)
+            batch.append(_row_xml(row_idx, attrs, cells))
+            continue
+        if parsed is None and row_idx > last_data_row:
+            continue
+        attrs, cells = parsed if parsed is not None else ({}, {})
+        for col, cell in cells.items():
+            if col <= max_col:
+                cell.clear()
+        if row_idx <= last_data_row:
+            row_data = rows[row_idx - start_row]
+            if (
+                style_template_has_custom_style
+                and row_idx != start_row
+                and all(col not in cells or cells[col].style == 0 for col in header_cols)
+            ):
+                for col in header_cols:
+                    cell = cells.setdefault(col, _CellXml({}))
+                    if template_styles.get(col) is not None:
+                        cell.attrs["s"] = template_styles[col]
+                    else:
+                        cell.attrs.pop("s", None)
+                if style_template_height is not None:
+                    attrs["ht"] = style_template_height
+                    attrs["customHeight"] = "1"
+            for header, col in header_map.items():
+                cell = cells.setdefault(col, _CellXml({}))
+                cell.set_value(row_data.get(header, ""), style_book)
+            if row_idx == start_row:
+                template_styles = {
+                    col: cells[col].attrs.get("s") for col in header_cols if col in cells
+                }
+        batch.append(_row_xml(row_idx, attrs, cells))
+        if len(batch) >= 512:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch)
+    yield "</sheetData>"
+    yield tail
+
+
+def render_items_xlsx(
+    template_path,
+    output,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+) -> bool:
+    """Preenche o template de itens gravando o XML da planilha diretamente.
+
+    `output` é um caminho ou arquivo binário. Devolve False, sem escrever
+    nada, quando o template tem algo que só o caminho openpyxl trata.
+    """
+    if not header_map:
+        return False
+    with zipfile.ZipFile(template_path) as archive:
+        sheet_entry = _active_sheet_entry(archive)
+        sheet_xml = archive.read(sheet_entry).decode("utf-8")
+        start = sheet_xml.find("<sheetData")
+        if start < 0:
+            return False
+        open_end = sheet_xml.index(">", start)
+        if sheet_xml[open_end - 1] == "/":
+            body, tail = "", sheet_xml[open_end + 1:]
+        else:
+            end = sheet_xml.index("</sheetData>", open_end)
+            body, tail = sheet_xml[open_end + 1:end], sheet_xml[end + len("</sheetData>"):]
+        head = _reset_sheet_view(sheet_xml[:start])
+
+        max_col = max(header_map.values())
+        template_rows = {}
+        for row_xml in _SHEET_ROW_RE.findall(body):
+            parsed = _parse_sheet_row(row_xml)
+            if parsed is None or not parsed[0].get("r", "").isdigit():
+                return False
+            row_idx = int(parsed[0]["r"])
+            if row_idx >= ITEMS_DATA_START_ROW and any(
+                col <= max_col and "<f" in cell.inner for col, cell in parsed[1].items()
+            ):
+                return False
+            template_rows[row_idx] = parsed
+        for ref in _MERGE_REF_RE.findall(tail):
+            min_col, min_row, max_merge_col, max_merge_row = range_boundaries(ref)
+            if max_merge_row >= ITEMS_DATA_START_ROW and min_col <= max_col:
+                return False
+
+        title = None
+        if ACTION_HEADER_KEY in header_map:
+            title = action_header_title(rows, art_num_preferred, action_header_title_preferred)
+        last_row = max([ITEMS_DATA_START_ROW + len(rows) - 1, *template_rows])
+        last_col = max(
+            [max_col, *(col for _, cells in template_rows.values() for col in cells)]
+        )
+        head = re.sub(
+            r"""(<dimension\b[^>]*\bref\s*=\s*)(["'])[^"']*\2""",
+            rf'\g<1>"A1:{get_column_letter(last_col)}{last_row}"',
+            head,
+            count=1,
+        )
+
+        styles_entry = "xl/styles.xml"
+        style_book = None
+        if styles_entry in archive.namelist():
+            style_book = _StyleBook(archive.read(styles_entry).decode("utf-8"))
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+            for info in archive.infolist():
+                if info.filename == styles_entry:
+                    continue
+                if info.filename != sheet_entry:
+                    target.writestr(info, archive.read(info.filename))
+                    continue
+                with target.open(info.filename, "w") as sheet_stream:
+                    for chunk in _iter_items_sheet_xml(
+                        head, template_rows, tail, rows, header_map, title, style_book
+                    ):
+                        sheet_stream.write(chunk.encode("utf-8"))
+            if style_book is not None:
+                styles_xml = style_book.xml() if style_book.changed else style_book.styles_xml
+                target.writestr(archive.getinfo(styles_entry), styles_xml.encode("utf-8"))
+    return True
+
+
+class BlankCellRange(namedtuple("BlankCellRange", ("meta", "column", "start_row", "end_row"))):
+    """Intervalo contínuo de células em branco numa coluna, dentro de uma meta."""
+
+    __slots__ = ()
+
+    @property
+    def ref(self) -> str:
+        start = f"{self.column}{self.start_row}"
+        if self.end_row == self.start_row:
+            return start
+        return f"{start}:{self.column}{self.end_row}"
+
+    @property
+    def size(self) -> int:
+        return self.end_row - self.start_row + 1
+
+
+ExcelReport = namedtuple(
+    "ExcelReport", ("data", "blank_ranges", "blank_cell_count", "missing_row_count")
+)
+
+
+def iter_row_blank_cells(rows, header_map, start_row: int = 3):
+    """Gera (meta, coluna, linha) dos campos vazios das linhas de itens."""
+    columns = [(header, get_column_letter(col_idx)) for header, col_idx in header_map.items()]
+    for excel_row, row_data in enumerate(rows, start=start_row):
+        meta = row_data.get("Número da Meta Específica") or ""
+        for header, column in columns:
+            value = row_data.get(header)
+            if value is None or value == "":
+                yield meta, column, excel_row
+
+
+def compress_blank_cells(cells):
+    """Agrupa (meta, coluna, linha) em `BlankCellRange`s: metas na ordem em que
+    aparecem, colunas em ordem de planilha e linhas consecutivas num só
+    intervalo (ex.: "J3:J812")."""
+    groups = {}
+    for meta, column, row in cells:
+        groups.setdefault(meta, {}).setdefault(column, set()).add(row)
+    ranges = []
+    for meta, columns in groups.items():
+        for column in sorted(columns, key=column_index_from_string):
+            rows = sorted(columns[column])
+            start = end = rows[0]
+            for row in rows[1:]:
+                if row != end + 1:
+                    ranges.append(BlankCellRange(meta, column, start, end))
+                    start = row
+                end = row
+            ranges.append(BlankCellRange(meta, column, start, end))
+    return ranges
+
+
+def _blank_cell_report(data, cells) -> ExcelReport:
+    ranges = compress_blank_cells(cells)
+    missing_rows = set()
+    for blank in ranges:
+        missing_rows.update(range(blank.start_row, blank.end_row + 1))
+    return ExcelReport(
+        data,
+        ranges,
+        sum(blank.size for blank in ranges),
+        len(missing_rows),
+    )
+
+
+def render_excel(
     template_path: Path,
-    output_path: Path,
+    output,
     rows,
     header_map,
     art_num_preferred=None,
     action_header_title_preferred=None,
     source_lines=None,
-):
-    wb = openpyxl.load_workbook(template_path)
+    analysis_data=None,
+) -> ExcelReport:
+    """Preenche o template e grava a planilha direto em `output`.
+
+    `output` é o destino da gravação: um caminho, um arquivo binário aberto
+    (ex.: `excel_spool()`) ou qualquer objeto com `write()`, inclusive sem
+    `seek`/`tell`. O relatório devolvido traz `output` em `data` e as células
+    em branco (`BlankCellRange`s agrupados por meta e coluna), calculadas na
+    própria escrita, sem reabrir o arquivo gerado.
+    """
+    layout = template_descriptor(template_path)
+    if not layout["analysis"]:
+        if render_items_xlsx(
+            template_path,
+            output,
+            rows,
+            header_map,
+            art_num_preferred=art_num_preferred,
+            action_header_title_preferred=action_header_title_preferred,
+        ):
+            return _blank_cell_report(output, iter_row_blank_cells(rows, header_map))
+    wb = load_template_workbook(template_path)
     ws = wb.active
-    if is_analysis_template_sheet(ws):
-        fill_analysis_template(ws, source_lines or [])
+    if layout["analysis"]:
+        if analysis_data is None:
+            analysis_data = extract_analysis_data(source_lines or [])
+        fill_analysis_template(ws, source_lines or [], analysis_data, layout=layout)
         header_row = find_items_table_header_row(ws)
+        items_header_map = layout["items_header_map"]
         if header_row and rows:
             _, items_header_map = get_header_info_from_ws(ws, header_row)
             update_action_header(
@@ -1260,7 +2808,14 @@ def write_excel(
                 header_row=header_row,
             )
             fill_worksheet(ws, rows, items_header_map, start_row=header_row + 1)
+        if not header_row:
+            header_row = layout["items_header_row"] or 2
+        blank_cells = [
+            *iter_analysis_blank_cells(analysis_data, layout["block_height"]),
+            *iter_row_blank_cells(rows, items_header_map, start_row=header_row + 1),
+        ]
     else:
+        blank_cells = list(iter_row_blank_cells(rows, header_map))
         update_action_header(
             ws,
             rows,
@@ -1273,67 +2828,395 @@ def write_excel(
     ws.sheet_view.selection[0].activeCell = "A1"
     ws.sheet_view.selection[0].sqref = "A1"
     ws.sheet_view.zoomScale = 100
-    wb.save(output_path)
+    wb.save(output)
+    return _blank_cell_report(output, blank_cells)
 
 
-def generate_excel_bytes(
+def write_excel(
     template_path: Path,
+    output_path: Path,
     rows,
     header_map,
     art_num_preferred=None,
     action_header_title_preferred=None,
     source_lines=None,
-) -> bytes:
-    wb = openpyxl.load_workbook(template_path)
-    ws = wb.active
-    if is_analysis_template_sheet(ws):
-        fill_analysis_template(ws, source_lines or [])
-        header_row = find_items_table_header_row(ws)
-        if header_row and rows:
-            _, items_header_map = get_header_info_from_ws(ws, header_row)
-            update_action_header(
-                ws,
-                rows,
-                items_header_map,
-                art_num_preferred=art_num_preferred,
-                action_header_title_preferred=action_header_title_preferred,
-                header_row=header_row,
-            )
-            fill_worksheet(ws, rows, items_header_map, start_row=header_row + 1)
-    else:
-        update_action_header(
-            ws,
+    analysis_data=None,
+):
+    render_excel(
+        template_path,
+        output_path,
+        rows,
+        header_map,
+        art_num_preferred=art_num_preferred,
+        action_header_title_preferred=action_header_title_preferred,
+        source_lines=source_lines,
+        analysis_data=analysis_data,
+    )
+
+
+def excel_spool(max_size: int = EXCEL_SPOOL_MAX_SIZE):
+    """Arquivo temporário que fica em memória até `max_size` bytes e depois
+    passa para o disco."""
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+b", suffix=".xlsx")
+
+
+def spool_excel(
+    template_path: Path,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+    source_lines=None,
+    analysis_data=None,
+    max_size: int = EXCEL_SPOOL_MAX_SIZE,
+) -> ExcelReport:
+    """`render_excel` num `excel_spool()`, já rebobinado para leitura."""
+    spool = excel_spool(max_size)
+    try:
+        report = render_excel(
+            template_path,
+            spool,
             rows,
             header_map,
             art_num_preferred=art_num_preferred,
             action_header_title_preferred=action_header_title_preferred,
+            source_lines=source_lines,
+            analysis_data=analysis_data,
         )
-        fill_worksheet(ws, rows, header_map)
-    ws.sheet_view.topLeftCell = "A1"
-    ws.sheet_view.selection[0].activeCell = "A1"
-    ws.sheet_view.selection[0].sqref = "A1"
-    ws.sheet_view.zoomScale = 100
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return report
+
+
+def generate_excel_bytes(
+    template_path: Path,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+    source_lines=None,
+    analysis_data=None,
+) -> bytes:
+    return generate_excel_report(
+        template_path,
+        rows,
+        header_map,
+        art_num_preferred=art_num_preferred,
+        action_header_title_preferred=action_header_title_preferred,
+        source_lines=source_lines,
+        analysis_data=analysis_data,
+    ).data
+
+
+def generate_excel_report(
+    template_path: Path,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+    source_lines=None,
+    analysis_data=None,
+) -> ExcelReport:
+    """Como `render_excel`, com a planilha devolvida em bytes."""
     buffer = BytesIO()
-    wb.save(buffer)
-    return buffer.getvalue()
+    report = render_excel(
+        template_path,
+        buffer,
+        rows,
+        header_map,
+        art_num_preferred=art_num_preferred,
+        action_header_title_preferred=action_header_title_preferred,
+        source_lines=source_lines,
+        analysis_data=analysis_data,
+    )
+    return report._replace(data=buffer.getvalue())
+
+
+class _ChunkSink:
+    """Destino só de escrita que entrega a planilha em blocos numa fila."""
+
+    def __init__(self, chunk_queue, stop_event, chunk_size: int):
+        self.chunk_queue = chunk_queue
+        self.stop_event = stop_event
+        self.chunk_size = chunk_size
+        self.pending = bytearray()
+        self.aborted = False
+
+    def write(self, data) -> int:
+        if self.stop_event.is_set():
+            # Interrompe a gravação uma vez; escritas seguintes (ex.: o
+            # fechamento do zip pelo coletor) são descartadas em silêncio.
+            if not self.aborted:
+                self.aborted = True
+                raise OSError("leitura dos blocos interrompida")
+            return len(data)
+        self.pending += data
+        while len(self.pending) >= self.chunk_size:
+            self.chunk_queue.put(bytes(self.pending[: self.chunk_size]))
+            del self.pending[: self.chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.pending:
+            self.chunk_queue.put(bytes(self.pending))
+            self.pending.clear()
+
+
+def _produce_excel_chunks(sink, template_path, rows, header_map, options):
+    try:
+        render_excel(template_path, sink, rows, header_map, **options)
+        sink.close()
+    except BaseException as exc:  # repassado ao consumidor
+        sink.chunk_queue.put(exc)
+        return
+    sink.chunk_queue.put(_STREAM_DONE)
+
+
+def iter_excel_chunks(
+    template_path: Path,
+    rows,
+    header_map,
+    art_num_preferred=None,
+    action_header_title_preferred=None,
+    source_lines=None,
+    analysis_data=None,
+    chunk_size: int = EXCEL_CHUNK_SIZE,
+    prefetch_chunks: int = EXCEL_PREFETCH_CHUNKS,
+):
+    """Gera a planilha em blocos de bytes (ex.: corpo de resposta HTTP).
+
+    A gravação roda numa thread produtora, como em `iter_lines_from_pdf`: o
+    zip é escrito em modo sequencial e só `prefetch_chunks` blocos ficam em
+    memória de cada vez.
+    """
+    chunk_queue = queue.Queue(maxsize=max(1, prefetch_chunks))
+    stop_event = threading.Event()
+    sink = _ChunkSink(chunk_queue, stop_event, chunk_size)
+    producer = threading.Thread(
+        target=_produce_excel_chunks,
+        args=(
+            sink,
+            template_path,
+            rows,
+            header_map,
+            dict(
+                art_num_preferred=art_num_preferred,
+                action_header_title_preferred=action_header_title_preferred,
+                source_lines=source_lines,
+                analysis_data=analysis_data,
+            ),
+        ),
+        daemon=True,
+    )
+    producer.start()
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is _STREAM_DONE:
+                break
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    finally:
+        stop_event.set()
+        # Libera a produtora caso esteja bloqueada numa fila cheia.
+        while producer.is_alive():
+            try:
+                chunk_queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        producer.join()
+
+
+def new_result_id() -> str:
+    return uuid.uuid4().hex
+
+
+def result_cache_key(pdf_key: str, template_path, **options) -> str:
+    """Id de resultado determinado pelo conteúdo: `pdf_cache_key` do PDF,
+    SHA-256 do template, `ENGINE_VERSION` e as opções de geração. O mesmo PDF
+    com o mesmo template reaproveita o resultado já guardado (`load_result`)."""
+    payload = json.dumps(
+        [pdf_key, template_digest(template_path), ENGINE_VERSION, options], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def result_workbook_path(result_id: str, results_dir=None) -> Path:
+    """Onde a planilha do resultado `result_id` deve ser gravada (ex.: como
+    `output` de `render_excel`)."""
+    if not RESULT_ID_RE.match(result_id or ""):
+        raise ValueError(f"Identificador de resultado inválido: {result_id!r}")
+    path = Path(results_dir or RESULTS_DIR) / f"{result_id}.xlsx"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
 
 
-def build_rows(parsed_items, header_map):
+def _result_summary_path(result_id: str, results_dir=None) -> Path:
+    return Path(results_dir or RESULTS_DIR) / f"{result_id}.json"
+
+
+def store_result(
+    result_id: str,
+    summary,
+    workbook_path=None,
+    results_dir=None,
+    max_bytes: int = RESULTS_MAX_BYTES,
+    ttl_seconds: float = RESULTS_TTL_SECONDS,
+):
+    """Grava o resumo (JSON) ao lado da planilha do resultado e aplica TTL e
+    limite de tamanho.
+
+    A planilha já deve estar em `result_workbook_path(result_id)` ou, quando
+    gerada à parte (ex.: num id provisório, para que duas sessões com o mesmo
+    `result_cache_key` não gravem o mesmo arquivo), em `workbook_path`, que é
+    movido para o lugar definitivo.
+    """
+    if workbook_path is not None:
+        os.replace(workbook_path, result_workbook_path(result_id, results_dir))
+    payload = dict(summary)
+    payload["blank_ranges"] = [list(blank) for blank in payload.get("blank_ranges", ())]
+    path = _result_summary_path(result_id, results_dir)
+    tmp_path = _unique_tmp_path(path)
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    evict_results(results_dir, max_bytes, ttl_seconds, keep=result_id)
+
+
+def load_result(result_id, results_dir=None, ttl_seconds: float = RESULTS_TTL_SECONDS):
+    """Resumo gravado por `store_result`, com `excel_path`; None se o
+    resultado expirou, foi removido ou o id é inválido."""
+    if not RESULT_ID_RE.match(result_id or ""):
+        return None
+    path = _result_summary_path(result_id, results_dir)
+    workbook_path = path.with_suffix(".xlsx")
+    try:
+        if time.time() - path.stat().st_mtime > ttl_seconds or not workbook_path.exists():
+            return None
+        summary = json.loads(path.read_text(encoding="utf-8"))
+        # Marca o uso recente para a política LRU.
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    summary["blank_ranges"] = [BlankCellRange(*blank) for blank in summary.get("blank_ranges", ())]
+    summary["excel_path"] = workbook_path
+    return summary
+
+
+def discard_result(result_id, results_dir=None):
+    if not RESULT_ID_RE.match(result_id or ""):
+        return
+    path = _result_summary_path(result_id, results_dir)
+    for entry in (path, path.with_suffix(".xlsx")):
+        try:
+            entry.unlink()
+        except OSError:
+            continue
+
+
+def evict_results(
+    results_dir=None,
+    max_bytes: int = RESULTS_MAX_BYTES,
+    ttl_seconds: float = RESULTS_TTL_SECONDS,
+    keep=None,
+):
+    """Remove resultados expirados e, depois, os menos usados até o total
+    caber em `max_bytes` (o resultado `keep` nunca é removido)."""
+    results = {}
+    for path in Path(results_dir or RESULTS_DIR).glob("*"):
+        result_id, _, suffix = path.name.partition(".")
+        if suffix not in ("json", "xlsx") or not RESULT_ID_RE.match(result_id):
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        last_used, size = results.get(result_id, (0.0, 0))
+        # O JSON é tocado a cada leitura; uma planilha órfã (falha antes do
+        # resumo) conta pela própria data de gravação.
+        results[result_id] = (max(last_used, stat.st_mtime), size + stat.st_size)
+    now = time.time()
+    total = sum(size for _, size in results.values())
+    for result_id, (last_used, size) in sorted(results.items(), key=lambda entry: entry[1]):
+        if result_id == keep:
+            continue
+        if total <= max_bytes and now - last_used <= ttl_seconds:
+            continue
+        discard_result(result_id, results_dir)
+        total -= size
+
+
+class RowRecord(_Record):
+    __slots__ = (
+        "meta",
+        "item",
+        "acao",
+        "acao_num",
+        "material",
+        "descricao",
+        "destinacao",
+        "instituicao",
+        "natureza",
+        "quantidade",
+        "unidade",
+        "quantidade_unidade",
+        "valor_total",
+        "status",
+        "valor_status",
+    )
+    FIELDS = {
+        "Número da Meta Específica": "meta",
+        "Número do Item": "item",
+        ACTION_HEADER_KEY: "acao",
+        ACTION_HEADER_NUM_KEY: "acao_num",
+        "Material/Serviço": "material",
+        "Descrição": "descricao",
+        "Destinação": "destinacao",
+        "Instituição": "instituicao",
+        "Natureza da Despesa": "natureza",
+        "Quantidade Planejada": "quantidade",
+        "Unidade de Medida": "unidade",
+        "Quantidade/Unidade": "quantidade_unidade",
+        "Valor Planejado Total": "valor_total",
+        "Status do Item": "status",
+        "Valor/Status": "valor_status",
+    }
+
+
+def build_rows(parsed_items, header_map, numeric_values=False):
+    """Monta as linhas da planilha a partir dos itens.
+
+    Com `numeric_values`, "Valor Planejado Total" sai como Decimal (gravado
+    como número com `CURRENCY_NUMBER_FORMAT`) em vez de texto formatado;
+    colunas combinadas como "Valor/Status" continuam texto.
+    """
     has_descricao = "Descrição" in header_map
     has_destinacao = "Destinação" in header_map
     has_quantidade_unidade = "Quantidade/Unidade" in header_map
     has_valor_status = "Valor/Status" in header_map
     has_unidade_col = "Unidade de Medida" in header_map
     has_status_col = "Status do Item" in header_map
+    wanted = item_fields_for_headers(header_map)
+    item_fields = [extract_fields(item_lines(item), wanted=wanted) for item in parsed_items]
+    raw_valores = [fields["valor_total"] for fields in item_fields]
+    valores = normalize_currency_column(raw_valores)
+    valores_cell = (
+        normalize_currency_column(raw_valores, numeric=True) if numeric_values else valores
+    )
+    quantidades = normalize_quantity_column([fields["quantidade"] for fields in item_fields])
     rows = []
-    for item in parsed_items:
-        fields = extract_fields(item["lines"])
+    for item, fields, valor_total, valor_cell, quantidade in zip(
+        parsed_items, item_fields, valores, valores_cell, quantidades
+    ):
         if has_descricao or has_destinacao:
             material = fields["bem"]
         else:
             material = build_material(fields["bem"], fields["descricao"], fields["destinacao"])
-        valor_total = format_currency(fields["valor_total"])
-        quantidade = parse_int(fields["quantidade"])
         unidade = fields["unidade"]
         status_item = item.get("status") or "Planejado"
         quantidade_unidade = ""
@@ -1352,23 +3235,23 @@ def build_rows(parsed_items, header_map):
                 valor_status = valor_total
             elif status_item:
                 valor_status = status_item
-        row = {
-            "Número da Meta Específica": item["meta"],
-            "Número do Item": item["item"],
-            ACTION_HEADER_KEY: fields["acao"] or fields["art"],
-            ACTION_HEADER_NUM_KEY: fields["art_num"],
-            "Material/Serviço": material,
-            "Descrição": fields["descricao"] if has_descricao else "",
-            "Destinação": fields["destinacao"] if has_destinacao else "",
-            "Instituição": fields["instituicao"],
-            "Natureza da Despesa": fields["natureza"],
-            "Quantidade Planejada": quantidade,
-            "Unidade de Medida": fields["unidade"],
-            "Quantidade/Unidade": quantidade_unidade,
-            "Valor Planejado Total": valor_total,
-            "Status do Item": status_item,
-            "Valor/Status": valor_status,
-        }
+        row = RowRecord(
+            meta=item["meta"],
+            item=item["item"],
+            acao=fields["acao"] or fields["art"],
+            acao_num=fields["art_num"],
+            material=material,
+            descricao=fields["descricao"] if has_descricao else "",
+            destinacao=fields["destinacao"] if has_destinacao else "",
+            instituicao=fields["instituicao"],
+            natureza=fields["natureza"],
+            quantidade=quantidade,
+            unidade=fields["unidade"],
+            quantidade_unidade=quantidade_unidade,
+            valor_total=valor_cell,
+            status=status_item,
+            valor_status=valor_status,
+        )
         rows.append(row)
     return rows
 
@@ -1382,6 +3265,27 @@ def main():
         help=f"Template obrigatório ({REQUIRED_TEMPLATE_NAME})",
     )
     parser.add_argument("--output", default="Itens NT - preenchido.xlsx", help="Planilha de saída")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processos para extrair o texto do PDF (0 = todos os núcleos)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignora o cache de linhas extraídas do PDF",
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="Libera o layout de cada página logo após extraí-la (PDFs muito grandes)",
+    )
+    parser.add_argument(
+        "--numeric-values",
+        action="store_true",
+        help="Grava Valor Planejado Total como número (formato R$) em vez de texto",
+    )
     args = parser.parse_args()
 
     pdf_path = Path(args.pdf)
@@ -1399,8 +3303,32 @@ def main():
     if not xlsx_path.exists():
         raise SystemExit(f"Planilha não encontrada: {xlsx_path}")
 
-    lines = extract_lines_from_pdf(pdf_path)
-    parsed_items = parse_items(lines)
+    workers = resolve_extraction_workers(args.workers)
+    cache_key = None if args.no_cache else pdf_cache_key(read_pdf_bytes(pdf_path))
+    analysis_mode = is_analysis_template_file(xlsx_path)
+    lines = load_cached_lines(cache_key) if cache_key else None
+    extraction_stats = {}
+    if lines is not None:
+        document = parse_document(lines, with_analysis=analysis_mode)
+    else:
+        if workers > 1:
+            line_source = extract_lines_from_pdf(
+                pdf_path,
+                workers=workers,
+                low_memory=args.low_memory,
+                stats=extraction_stats,
+            )
+        else:
+            # Extração e parsing em paralelo: os itens são montados enquanto
+            # as páginas seguintes ainda estão sendo lidas.
+            line_source = iter_lines_from_pdf(
+                pdf_path, low_memory=args.low_memory, stats=extraction_stats
+            )
+        document = parse_document(line_source, with_analysis=analysis_mode)
+        if cache_key and document["lines"]:
+            store_cached_lines(cache_key, document["lines"])
+    lines = document["lines"]
+    parsed_items = document["items"]
     if not parsed_items:
         raise SystemExit("Nenhum item encontrado no PDF.")
 
@@ -1409,18 +3337,19 @@ def main():
     action_header_title_preferred = resolve_action_header_title_by_plan(
         signature["sigla"], signature["ano"]
     )
-    analysis_mode = is_analysis_template_file(xlsx_path)
     if analysis_mode:
         _, _, items_header_map = get_analysis_items_header_info(xlsx_path)
         if not items_header_map:
             raise SystemExit(
                 "Não foi possível localizar a tabela de itens no template de análise."
             )
-        rows = build_rows(parsed_items, items_header_map)
+        rows = build_rows(
+            parsed_items, items_header_map, numeric_values=args.numeric_values
+        )
         header_map = {}
     else:
         _, header_map = get_template_header_info(xlsx_path)
-        rows = build_rows(parsed_items, header_map)
+        rows = build_rows(parsed_items, header_map, numeric_values=args.numeric_values)
     write_excel(
         xlsx_path,
         output_path,
@@ -1429,10 +3358,16 @@ def main():
         art_num_preferred=art_num_preferred,
         action_header_title_preferred=action_header_title_preferred,
         source_lines=lines,
+        analysis_data=document["analysis"],
     )
 
     print(f"Itens extraídos: {len(rows)}")
     print(f"Arquivo gerado: {output_path}")
+    if extraction_stats.get("peak_rss_bytes"):
+        print(
+            f"Páginas lidas: {extraction_stats['pages']} | "
+            f"pico de memória: {extraction_stats['peak_rss_bytes'] / (1024 * 1024):.1f} MB"
+        )
 
 
 if __name__ == "__main__":
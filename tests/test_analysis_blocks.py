@@ -0,0 +1,95 @@
+"""Replicação dos blocos de análise em templates com bloco esparso."""
+
+from io import BytesIO
+
+import openpyxl
+import pytest
+from openpyxl.styles import Alignment, Border, Font, Side
+
+import planilha_engine as engine
+
+BLOCK_HEIGHT = 11
+START = engine.ANALYSIS_BLOCK_START_ROW
+END = START + BLOCK_HEIGHT - 1
+
+
+def build_sparse_analysis_sheet():
+    """Bloco de 11 linhas com poucas células gravadas e A/E mescladas.
+
+    O workbook passa por um salvamento para que as células ausentes e as sem
+    estilo voltem como no template real (sem StyleArray materializado).
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws["A2"] = engine.ANALYSIS_TEMPLATE_TITLE
+    thin = Side(style="thin")
+    ws.cell(START, 1, "2* meta 2*").font = Font(bold=True)
+    ws.cell(START, 1).alignment = Alignment(wrap_text=True, vertical="top")
+    ws.cell(START, 5, "3* fonte 3*").border = Border(left=thin, right=thin)
+    ws.cell(START, 6, "4* descrição 4* 5* fórmula 5*")
+    ws.cell(START + 2, 9).number_format = "0.00%"
+    ws.cell(END, 12).border = Border(bottom=thin)
+    ws.merge_cells(f"A{START}:A{END}")
+    ws.merge_cells(f"E{START}:E{END}")
+    ws.row_dimensions[START].height = 30
+    ws.cell(END + 2, 1, "ITENS DE CONTRATAÇÃO")
+    buffer = BytesIO()
+    wb.save(buffer)
+    return openpyxl.load_workbook(BytesIO(buffer.getvalue())).active
+
+
+def block_snapshot(ws, start_row):
+    cells = []
+    for offset in range(BLOCK_HEIGHT):
+        for col in range(engine.ANALYSIS_BLOCK_START_COL, engine.ANALYSIS_BLOCK_END_COL + 1):
+            cell = ws.cell(start_row + offset, col)
+            cells.append(
+                (
+                    offset,
+                    col,
+                    cell.value,
+                    repr(cell.font),
+                    repr(cell.border),
+                    repr(cell.alignment),
+                    cell.number_format,
+                )
+            )
+    merges = sorted(
+        (rng.min_row - start_row, rng.min_col, rng.max_row - start_row, rng.max_col)
+        for rng in ws.merged_cells.ranges
+        if start_row <= rng.min_row <= start_row + BLOCK_HEIGHT - 1
+    )
+    return cells, merges, ws.row_dimensions[start_row].height
+
+
+def test_replicates_sparse_multirow_block():
+    ws = build_sparse_analysis_sheet()
+    dst_rows = [START + idx * BLOCK_HEIGHT for idx in range(1, 4)]
+    engine._insert_rows_preserving_merges(ws, END + 1, len(dst_rows) * BLOCK_HEIGHT)
+
+    # O bloco-modelo só é lido depois da cópia: ler antes materializaria as
+    # células e os estilos ausentes.
+    engine._replicate_analysis_block(ws, START, dst_rows, BLOCK_HEIGHT)
+
+    expected = block_snapshot(ws, START)
+    for dst_row in dst_rows:
+        assert block_snapshot(ws, dst_row) == expected
+
+
+@pytest.mark.parametrize("metas", [1, 4])
+def test_fill_analysis_template_with_sparse_block(metas):
+    ws = build_sparse_analysis_sheet()
+    sections = [{"meta_texto": f"{idx} - Meta {idx}"} for idx in range(1, metas + 1)]
+    analysis_data = {"zero_indicador_geral": "", "one_meta_geral": "", "sections": sections}
+
+    engine.fill_analysis_template(ws, [], analysis_data)
+
+    merged = {str(rng) for rng in ws.merged_cells.ranges}
+    for idx in range(metas):
+        start_row = START + idx * BLOCK_HEIGHT
+        end_row = start_row + BLOCK_HEIGHT - 1
+        assert ws.cell(start_row, 1).value == f"{idx + 1} - Meta {idx + 1}"
+        assert f"A{start_row}:A{end_row}" in merged
+        assert f"E{start_row}:E{end_row}" in merged
+        assert ws.cell(start_row, 1).font.b
+    assert engine._find_items_title_row(ws) > START + metas * BLOCK_HEIGHT - 1
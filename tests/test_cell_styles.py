@@ -0,0 +1,26 @@
+"""Acesso direto ao StyleArray das células (`_cell_style_array`)."""
+
+import openpyxl
+from openpyxl.styles.cell_style import StyleArray
+
+import planilha_engine as engine
+
+
+def test_new_cell_gets_style_array():
+    ws = openpyxl.Workbook().active
+    cell = ws.cell(5, 5)
+    assert cell._style is None
+
+    style = engine._cell_style_array(cell)
+    assert isinstance(style, StyleArray)
+    style.numFmtId = 44
+    assert cell._style is style
+    assert cell.number_format == openpyxl.styles.numbers.BUILTIN_FORMATS[44]
+
+
+def test_existing_style_array_is_reused():
+    ws = openpyxl.Workbook().active
+    cell = ws.cell(1, 1)
+    cell.number_format = "0.00"
+    style = cell._style
+    assert engine._cell_style_array(cell) is style
@@ -0,0 +1,40 @@
+import gzip
+
+import planilha_engine as engine
+
+
+def test_cached_lines_round_trip(tmp_path):
+    engine.store_cached_lines("abc", ["linha 1", "linha 2"], cache_dir=tmp_path)
+    assert engine.load_cached_lines("abc", cache_dir=tmp_path) == ["linha 1", "linha 2"]
+
+
+def test_missing_entry_is_a_miss(tmp_path):
+    assert engine.load_cached_lines("ausente", cache_dir=tmp_path) is None
+
+
+def test_corrupted_entry_is_a_miss_and_removed(tmp_path):
+    engine.store_cached_lines("abc", ["linha"] * 200, cache_dir=tmp_path)
+    path = tmp_path / f"abc{engine.LINES_CACHE_SUFFIX}"
+    data = bytearray(path.read_bytes())
+    # Danifica o fluxo deflate logo após o cabeçalho gzip (10 bytes).
+    for pos in range(12, 20):
+        data[pos] ^= 0xFF
+    path.write_bytes(bytes(data))
+    try:
+        gzip.decompress(bytes(data))
+    except Exception:
+        pass
+    else:  # pragma: no cover - a corrupção precisa ser efetiva
+        raise AssertionError("entrada não foi corrompida")
+
+    assert engine.load_cached_lines("abc", cache_dir=tmp_path) is None
+    assert not path.exists()
+
+
+def test_truncated_entry_is_a_miss_and_removed(tmp_path):
+    engine.store_cached_lines("abc", ["linha"] * 200, cache_dir=tmp_path)
+    path = tmp_path / f"abc{engine.LINES_CACHE_SUFFIX}"
+    path.write_bytes(path.read_bytes()[:15])
+
+    assert engine.load_cached_lines("abc", cache_dir=tmp_path) is None
+    assert not path.exists()
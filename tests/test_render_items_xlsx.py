@@ -0,0 +1,226 @@
+"""Escrita direta do XML (`render_items_xlsx`) contra o caminho openpyxl.
+
+Cada template de itens é gerado a partir do `Planilha Base(atualizada).xlsx`
+(estilos, tema e workbook), trocando só a planilha. As duas saídas são
+reabertas com openpyxl e comparadas célula a célula: valor, formato numérico,
+style id e os componentes do estilo.
+"""
+
+import re
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+import openpyxl
+import pytest
+from openpyxl.utils import get_column_letter
+
+import planilha_engine as engine
+
+BASE_TEMPLATE = Path(__file__).resolve().parent.parent / "Planilha Base(atualizada).xlsx"
+SHEET_ENTRY = "xl/worksheets/sheet1.xml"
+# Estilos da linha modelo (linha 3) por coluna, todos existentes no styles.xml
+# do template base.
+TEMPLATE_ROW_STYLES = [2, 3, 3, 3, 3, 3, 3, 3, 3, 4, 4, 5]
+
+
+def _header_cells(quote='"'):
+    q = quote
+    return "".join(
+        f"<c r={q}{get_column_letter(col)}2{q} s={q}1{q} t={q}inlineStr{q}>"
+        f"<is><t>{header}</t></is></c>"
+        for col, header in enumerate(engine.OUTPUT_HEADERS, start=1)
+    )
+
+
+def _template_row(quote='"'):
+    q = quote
+    cells = "".join(
+        f"<c r={q}{get_column_letter(col)}3{q} s={q}{style}{q}/>"
+        for col, style in enumerate(TEMPLATE_ROW_STYLES, start=1)
+    )
+    return f'<row r={q}3{q} ht="40" customHeight="1">{cells}</row>'
+
+
+def build_items_template(
+    path,
+    extra_rows="",
+    merges=("A1:C1",),
+    sheet_view='<sheetViews><sheetView workbookViewId="0"/></sheetViews>',
+    quote='"',
+):
+    q = quote
+    rows = [
+        '<row r="1" ht="16" customHeight="1"><c r="N1"><f>1+1</f><v>2</v></c></row>',
+        f'<row r={q}2{q} ht="50" customHeight="1">{_header_cells(quote)}</row>',
+        _template_row(quote),
+        '<row r="6"><c r="A6" s="6"/><c r="M6" s="3" t="inlineStr"><is><t>nota</t></is></c></row>',
+        extra_rows,
+    ]
+    merge_xml = ""
+    if merges:
+        merge_xml = f'<mergeCells count="{len(merges)}">' + "".join(
+            f"<mergeCell ref={q}{ref}{q}/>" for ref in merges
+        ) + "</mergeCells>"
+    with zipfile.ZipFile(BASE_TEMPLATE) as base:
+        base_sheet = base.read(SHEET_ENTRY).decode("utf-8")
+        head = base_sheet[: base_sheet.index("<sheetData")]
+        head = re.sub(r"<sheetViews>.*?</sheetViews>", sheet_view, head, flags=re.DOTALL)
+        head = re.sub(r'<dimension ref="[^"]*"/>', f"<dimension ref={q}A1:N6{q}/>", head)
+        sheet_xml = (
+            f"{head}<sheetData>{''.join(rows)}</sheetData>{merge_xml}"
+            '<pageMargins left="0.3" right="0.3" top="0.5" bottom="0.5" header="0.3" footer="0.3"/>'
+            "</worksheet>"
+        )
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as out:
+            for info in base.infolist():
+                data = sheet_xml.encode("utf-8") if info.filename == SHEET_ENTRY else base.read(info)
+                out.writestr(info, data)
+    return path
+
+
+def make_rows(count, numeric=False):
+    rows = []
+    for idx in range(count):
+        valor = f"R$ {idx * 1000 + 12},50"
+        if numeric:
+            valor = Decimal(f"{idx * 1000 + 12}.50")
+        rows.append(
+            engine.RowRecord(
+                meta=idx // 3 + 1,
+                item=idx + 1,
+                acao="Ação & <controle>" if idx % 2 else "",
+                acao_num="V" if idx % 4 == 1 else "",
+                material=f'Bem/Serviço: "item {idx}" | Descrição: texto',
+                descricao=" com espaços " if idx % 5 == 0 else "",
+                destinacao="linha 1\nlinha 2",
+                instituicao="PC & PM",
+                natureza="Custeio" if idx % 3 else "",
+                quantidade=str(idx + 1),
+                unidade="un",
+                quantidade_unidade=f"{idx + 1} un",
+                valor_total=valor if idx % 7 != 3 else "",
+                status="Aprovado",
+                valor_status=valor,
+            )
+        )
+    return rows
+
+
+def dump_workbook(data):
+    ws = openpyxl.load_workbook(BytesIO(data)).active
+    cells = {}
+    for row in ws.iter_rows():
+        for cell in row:
+            if cell.value is None and not cell.has_style:
+                continue
+            cells[cell.coordinate] = (
+                None if cell.value == "" else cell.value,
+                cell.number_format,
+                cell.style_id,
+                repr(cell.font),
+                repr(cell.fill),
+                repr(cell.border),
+                repr(cell.alignment),
+            )
+    heights = {
+        idx: dim.height for idx, dim in ws.row_dimensions.items() if dim.height is not None
+    }
+    view = ws.sheet_view
+    return {
+        "cells": cells,
+        "merged": sorted(map(str, ws.merged_cells.ranges)),
+        "heights": heights,
+        "view": (view.topLeftCell, view.zoomScale, view.selection[0].activeCell),
+        "dimensions": (ws.max_row, ws.max_column),
+    }
+
+
+def render_both(monkeypatch, template, rows, header_map, **kwargs):
+    fast = BytesIO()
+    assert engine.render_items_xlsx(template, fast, rows, header_map, **kwargs)
+    with monkeypatch.context() as patch:
+        patch.setattr(engine, "render_items_xlsx", lambda *args, **kw: False)
+        slow = engine.generate_excel_bytes(template, rows, header_map, **kwargs)
+    return dump_workbook(fast.getvalue()), dump_workbook(slow)
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 40])
+@pytest.mark.parametrize("numeric", [False, True])
+def test_matches_openpyxl_path(tmp_path, monkeypatch, count, numeric):
+    template = build_items_template(tmp_path / "itens.xlsx")
+    _, header_map = engine.get_template_header_info(template)
+    fast, slow = render_both(monkeypatch, template, make_rows(count, numeric), header_map)
+    assert fast == slow
+
+
+def test_matches_openpyxl_path_with_action_title(tmp_path, monkeypatch):
+    template = build_items_template(tmp_path / "itens.xlsx")
+    _, header_map = engine.get_template_header_info(template)
+    fast, slow = render_both(
+        monkeypatch,
+        template,
+        make_rows(12),
+        header_map,
+        art_num_preferred="V",
+        action_header_title_preferred="Ação conforme Art. 9º",
+    )
+    assert fast == slow
+
+
+def test_matches_openpyxl_path_with_frozen_pane(tmp_path, monkeypatch):
+    template = build_items_template(
+        tmp_path / "itens.xlsx",
+        sheet_view=(
+            '<sheetViews><sheetView tabSelected="1" zoomScale="85" workbookViewId="0">'
+            '<pane ySplit="2" topLeftCell="A3" activePane="bottomLeft" state="frozen"/>'
+            '<selection pane="bottomLeft" activeCell="B5" sqref="B5"/></sheetView></sheetViews>'
+        ),
+    )
+    _, header_map = engine.get_template_header_info(template)
+    fast, slow = render_both(monkeypatch, template, make_rows(8, numeric=True), header_map)
+    assert fast == slow
+
+
+def test_single_quoted_attributes(tmp_path, monkeypatch):
+    template = build_items_template(tmp_path / "itens.xlsx", quote="'")
+    _, header_map = engine.get_template_header_info(template)
+    fast, slow = render_both(monkeypatch, template, make_rows(8, numeric=True), header_map)
+    assert fast == slow
+    assert fast["cells"]["B4"][2] == slow["cells"]["B3"][2] != 0
+
+
+def test_formula_outside_data_columns_keeps_fast_path(tmp_path, monkeypatch):
+    # Fórmulas acima da área de dados (N1) ou fora das colunas mapeadas (N8)
+    # não impedem a escrita direta.
+    template = build_items_template(
+        tmp_path / "itens.xlsx", extra_rows='<row r="8"><c r="N8"><f>N1*2</f><v>4</v></c></row>'
+    )
+    _, header_map = engine.get_template_header_info(template)
+    fast, slow = render_both(monkeypatch, template, make_rows(10), header_map)
+    assert fast == slow
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"extra_rows": '<row r="7"><c r="D7"><f>1+2</f><v>3</v></c></row>'},
+        {"merges": ("A1:C1", "D5:E6")},
+        {"merges": ("A1:C1", "B3:B4")},
+        {"extra_rows": '<row r="7"><c s="3"/></row>'},
+        {"extra_rows": '<row><c r="A9" s="3"/></row>'},
+    ],
+    ids=["formula", "merge", "merge-template-row", "cell-without-ref", "row-without-ref"],
+)
+def test_falls_back_without_writing(tmp_path, options):
+    template = build_items_template(tmp_path / "itens.xlsx", **options)
+    _, header_map = engine.get_template_header_info(template)
+    output = BytesIO()
+    assert not engine.render_items_xlsx(template, output, make_rows(5), header_map)
+    assert output.getvalue() == b""
+
+
+def test_empty_header_map_falls_back(tmp_path):
+    template = build_items_template(tmp_path / "itens.xlsx")
+    assert not engine.render_items_xlsx(template, BytesIO(), make_rows(2), {})
@@ -0,0 +1,50 @@
+"""Gravação concorrente de resultados e entradas de cache."""
+
+import threading
+
+import planilha_engine as engine
+
+RESULT_ID = "a" * 32
+
+
+def run_concurrently(target, threads=4, repeat=50):
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(repeat):
+                target()
+        except Exception as exc:  # pragma: no cover - só aparece em falha
+            errors.append(exc)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return errors
+
+
+def test_concurrent_store_result_same_id(tmp_path):
+    assert engine.RESULT_ID_RE.match(RESULT_ID)
+    engine.result_workbook_path(RESULT_ID, tmp_path).write_bytes(b"xlsx")
+    summary = {"metas": 3, "blank_ranges": []}
+
+    errors = run_concurrently(lambda: engine.store_result(RESULT_ID, summary, results_dir=tmp_path))
+
+    assert errors == []
+    assert engine.load_result(RESULT_ID, tmp_path)["metas"] == 3
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_concurrent_cache_writes_leave_no_temp_files(tmp_path):
+    errors = run_concurrently(
+        lambda: (
+            engine.store_cached_lines("chave", ["a", "b"], tmp_path),
+            engine.store_template_descriptor("digest", {"version": 1}, tmp_path),
+        )
+    )
+
+    assert errors == []
+    assert engine.load_cached_lines("chave", tmp_path) == ["a", "b"]
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+import planilha_engine as engine
+
+BASE_TEMPLATE = Path(__file__).resolve().parent.parent / "Planilha Base(atualizada).xlsx"
+
+
+def test_template_worksheets_are_independent_copies():
+    first = engine._template_worksheet(BASE_TEMPLATE)
+    first["Z999"].value = "alterada"
+    second = engine._template_worksheet(BASE_TEMPLATE)
+    assert first is not second
+    assert (999, 26) not in second._cells
+    assert engine.load_template_workbook(BASE_TEMPLATE).active["Z999"].value is None
+
+
+def test_template_descriptor_is_cached_per_file_version():
+    descriptor = engine.template_descriptor(BASE_TEMPLATE)
+    assert engine.template_descriptor(BASE_TEMPLATE) is descriptor
+    assert descriptor["analysis"]